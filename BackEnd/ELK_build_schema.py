@@ -1,7 +1,14 @@
 import requests
 import json
+import os
 import re
-from typing import List, Dict, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from BackEnd.es_client import get_es_session
+from BackEnd.es_indices import normalize_index_name
+from BackEnd.schema_catalog import atomic_write_json
 
 ES_URL = "http://192.168.111.162:9200"
 SKIP_KEYWORD = True          # bỏ field .keyword
@@ -10,6 +17,36 @@ TIMEOUT = 60
 OUT_FILE = "docs/ELK_schema.json"
 # Nếu cần auth: ("user", "pass") hoặc None
 AUTH = None  # ("elastic", "changeme")
+WORKERS = int(os.getenv("ELK_SCHEMA_WORKERS", "4"))             # groups / msearch batches in parallel
+RATE_LIMIT = float(os.getenv("ELK_SCHEMA_RATE_LIMIT", "10"))    # max requests per second to the cluster, 0 = off
+
+# ---------- request throttling ----------
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_limiter = RateLimiter(RATE_LIMIT)
+
+def es_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Rate-limited request through the shared ES session."""
+    _limiter.wait()
+    r = get_es_session().request(method, url, timeout=TIMEOUT, auth=AUTH, **kwargs)
+    r.raise_for_status()
+    return r
 
 # ---------- flatten mapping (unchanged) ----------
 def flatten_properties(props, prefix=""):
@@ -28,14 +65,35 @@ def flatten_properties(props, prefix=""):
     return fields
 
 # ---------- get all fields from mapping ----------
+_mapping_cache: Dict[Tuple[str, str], List[str]] = {}
+_mapping_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_mapping_locks_guard = threading.Lock()
+
 def get_all_fields(es_url: str, index_pattern: str) -> List[str]:
     """
     index_pattern can be a pattern like 'windows-*', '.ds-filebeat-*', or a comma-separated list of indices.
+    Each pattern's mapping is fetched at most once per run, even across threads.
     """
+    key = (es_url, index_pattern)
+    if key in _mapping_cache:
+        return _mapping_cache[key]
+    with _mapping_locks_guard:
+        lock = _mapping_locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _mapping_cache:
+            _mapping_cache[key] = _fetch_mapping_fields(es_url, index_pattern)
+    return _mapping_cache[key]
+
+def clear_mapping_cache():
+    """Forget cached mappings, for long-running callers that rebuild periodically."""
+    with _mapping_locks_guard:
+        _mapping_cache.clear()
+        _mapping_locks.clear()
+
+def _fetch_mapping_fields(es_url: str, index_pattern: str) -> List[str]:
     url = f"{es_url.rstrip('/')}/{index_pattern}/_mapping"
-    r = requests.get(url, timeout=TIMEOUT, auth=AUTH)
-    r.raise_for_status()
-    mapping = r.json()
+    params = {"ignore_unavailable": "true", "allow_no_indices": "true"}
+    mapping = es_request("GET", url, params=params).json()
 
     fields = set()
 
@@ -68,6 +126,58 @@ def get_all_fields(es_url: str, index_pattern: str) -> List[str]:
 
     return sorted(fields)
 
+# ---------- field_caps (one request per pattern) ----------
+# None = not probed yet; False = cluster rejected include_empty_fields as unknown (ES < 8.13)
+_field_caps_empty_supported: Optional[bool] = None
+
+def get_field_caps(es_url: str, index_pattern: str, include_empty_fields: bool = True) -> dict:
+    url = f"{es_url.rstrip('/')}/{index_pattern}/_field_caps"
+    params = {"fields": "*", "ignore_unavailable": "true", "allow_no_indices": "true"}
+    if not include_empty_fields:
+        params["include_empty_fields"] = "false"
+    return es_request("GET", url, params=params).json()
+
+def fields_from_caps(caps: dict) -> Dict[str, str]:
+    """{field: type} from a _field_caps response, without metadata fields like _id / _index."""
+    out: Dict[str, str] = {}
+    for name, by_type in caps.get("fields", {}).items():
+        types = [t for t in by_type if not t.startswith("_")]
+        if not types or name.startswith("_"):
+            continue
+        if SKIP_KEYWORD and ".keyword" in name:
+            continue
+        out[name] = types[0] if len(types) == 1 else "conflict"
+    return out
+
+def get_fields_with_data(es_url: str, index_pattern: str) -> List[str]:
+    """
+    Fields that have at least one value in the pattern's indices.
+
+    Uses _field_caps?include_empty_fields=false (a single request). On clusters
+    that reject that parameter, falls back to the cached mapping plus the
+    _msearch exists probe.
+    """
+    global _field_caps_empty_supported
+    if _field_caps_empty_supported is not False:
+        try:
+            caps = get_field_caps(es_url, index_pattern, include_empty_fields=False)
+            _field_caps_empty_supported = True
+            return sorted(fields_from_caps(caps))
+        except requests.HTTPError as e:
+            # only "unrecognized parameter: [include_empty_fields]" means an old cluster;
+            # any other 400 (a bad pattern, say) is a real error
+            if e.response is None or e.response.status_code != 400 or _field_caps_empty_supported \
+                    or "include_empty_fields" not in (e.response.text or ""):
+                raise
+            print("  include_empty_fields not supported by this cluster, falling back to mapping + _msearch")
+            _field_caps_empty_supported = False
+
+    fields = get_all_fields(es_url, index_pattern)
+    if not fields:
+        return []
+    print(f"  Found {len(fields)} candidate fields (after mapping)")
+    return filter_fields_that_exist(es_url, index_pattern, fields, BATCH)
+
 # ---------- build _msearch payload ----------
 def build_msearch_payload(fields: List[str]) -> str:
     lines = []
@@ -80,106 +190,47 @@ def build_msearch_payload(fields: List[str]) -> str:
     return "\n".join(lines) + "\n"
 
 # ---------- check which fields actually have data ----------
-def filter_fields_that_exist(es_url: str, index_pattern: str, fields: List[str], batch: int) -> List[str]:
-    url = f"{es_url.rstrip('/')}/{index_pattern}/_msearch"
+# batches get their own pool so a group worker waiting on its batches never starves them
+_batch_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="msearch")
+
+def _msearch_batch(url: str, chunk: List[str]) -> List[str]:
     headers = {"Content-Type": "application/x-ndjson"}
+    payload = build_msearch_payload(chunk)
+    resp = es_request("POST", url, data=payload, headers=headers).json()
 
     result = []
+    responses = resp.get("responses", [])
+    for fname, rsp in zip(chunk, responses):
+        # some ES versions respond differently; handle safely
+        hits = rsp.get("hits", {})
+        total = hits.get("total", 0)
+        if isinstance(total, dict):
+            total = total.get("value", 0)
+
+        # also some responses might include "error" key for a given query - skip those
+        if isinstance(total, int) and total > 0:
+            result.append(fname)
+    return result
 
-    for i in range(0, len(fields), batch):
-        chunk = fields[i:i + batch]
-        payload = build_msearch_payload(chunk)
-
-        r = requests.post(url, data=payload, headers=headers, timeout=TIMEOUT, auth=AUTH)
-        r.raise_for_status()
-        resp = r.json()
-
-        responses = resp.get("responses", [])
-        for fname, rsp in zip(chunk, responses):
-            # some ES versions respond differently; handle safely
-            hits = rsp.get("hits", {})
-            total = hits.get("total", 0)
-            if isinstance(total, dict):
-                total = total.get("value", 0)
-
-            # also some responses might include "error" key for a given query - skip those
-            if isinstance(total, int) and total > 0:
-                result.append(fname)
-
+def filter_fields_that_exist(es_url: str, index_pattern: str, fields: List[str], batch: int) -> List[str]:
+    url = f"{es_url.rstrip('/')}/{index_pattern}/_msearch"
+    chunks = [fields[i:i + batch] for i in range(0, len(fields), batch)]
+    # map() keeps batch order, so the merged list is deterministic
+    result = []
+    for found in _batch_pool.map(lambda chunk: _msearch_batch(url, chunk), chunks):
+        result.extend(found)
     return result
 
 # ---------- index listing & normalization ----------
-COMMON_ALIAS = {
-    "winlogbeat": "windows",
-    "windows": "windows",
-    "filebeat": "filebeat",
-    "metricbeat": "metricbeat",
-    "auditbeat": "auditbeat",
-    "zeek": "zeek",
-    "suricata": "suricata",
-    "packetbeat": "packetbeat",
-    "panw": "panw",
-    "cisco": "cisco",
-    "iis": "windows",
-    "syslog": "syslog",
-}
-
-RE_DS_PREFIX = re.compile(r'^\.ds-')
-RE_VERSION_SEG = re.compile(r'-(?:\d+\.)+\d+(?:-|$)')    # -8.14.3- or -8.14.3$
-RE_DATE_PATTERNS = [
-    re.compile(r'\{\%.*?\%\}'),                          # {%time%} or similar
-    re.compile(r'\d{4}[.\-]\d{2}[.\-]\d{2}'),            # 2025.01.01 or 2025-01-01
-    re.compile(r'^\*$'),                                 # wildcard
-]
-
 def list_indices(es_url: str, pattern: Optional[str] = None) -> List[str]:
     url = f"{es_url.rstrip('/')}/_cat/indices?h=index&format=json"
-    r = requests.get(url, timeout=TIMEOUT, auth=AUTH)
-    r.raise_for_status()
-    arr = r.json()
+    arr = es_request("GET", url).json()
     indices = [item["index"] for item in arr if "index" in item]
     if pattern:
         # simple contains match (fast). If you want glob semantics, change here.
         indices = [i for i in indices if pattern in i]
     return indices
 
-def normalize_index_name(index: str) -> str:
-    original = index
-    name = index.lstrip('.')
-
-    # datastream pattern: .ds-<name>-<version>-...
-    if index.startswith(".ds-") or name.startswith("ds-"):
-        # remove .ds- prefix then take tokens
-        name_no_ds = RE_DS_PREFIX.sub('', index).lstrip('.')
-        tokens = [t for t in re.split(r'[-_.]', name_no_ds) if t]
-        if tokens:
-            base = tokens[0].lower()
-            base = RE_VERSION_SEG.sub('', base)
-            return COMMON_ALIAS.get(base, base)
-
-    # remove version segments like -8.14.3-
-    name = RE_VERSION_SEG.sub('-', name)
-
-    tokens = re.split(r'[-_.]', name)
-    tokens = [t for t in tokens if t]
-    if not tokens:
-        return original
-
-    # prefer an alphabetic token
-    for t in tokens:
-        tl = t.lower()
-        if tl and not tl.isdigit() and tl not in ('ds',):
-            if any(p.search(tl) for p in RE_DATE_PATTERNS):
-                continue
-            if tl in COMMON_ALIAS:
-                return COMMON_ALIAS[tl]
-            return tl
-
-    # fallback
-    base_lower = tokens[0].lower()
-    base_clean = re.sub(r'[^a-zA-Z0-9]+$', '', base_lower)
-    return COMMON_ALIAS.get(base_clean, base_clean or original)
-
 def group_indices_by_normalized_name(es_url: str, pattern: Optional[str] = None) -> Dict[str, List[str]]:
     indices = list_indices(es_url, pattern)
     groups: Dict[str, List[str]] = {}
@@ -189,85 +240,63 @@ def group_indices_by_normalized_name(es_url: str, pattern: Optional[str] = None)
     return groups
 
 # ---------- main orchestration: run per group ----------
-def process_all_groups(es_url: str):
+def process_group(es_url: str, group_name: str, indices: List[str]) -> List[str]:
+    """
+    Fields with data for one index group, trying "<group>-*", then the
+    datastream pattern ".ds-<group>-*", then an explicit list of (at most 100)
+    indices. The first pattern that yields fields wins.
+    """
+    # limit to 100 indices to avoid huge request URL
+    join_list = indices if len(indices) <= 100 else indices[:100]
+    candidates = [
+        (f"{group_name}-*", f"{group_name}-*"),
+        (f".ds-{group_name}-*", f".ds-{group_name}-*"),
+        (",".join(join_list), f"(indices list, {len(join_list)} items)"),
+    ]
+    tried_patterns = []
+    for pattern, label in candidates:
+        tried_patterns.append(label)
+        print(f"  Trying pattern: {label}")
+        fields = get_fields_with_data(es_url, pattern)
+        if fields:
+            print(f"  {len(fields)} fields actually have data for group '{group_name}' ({label})")
+            return sorted(fields)
+
+    print(f"  WARNING: No fields with data found for group {group_name} using patterns: {tried_patterns}")
+    return []
+
+def _process_group_safe(es_url: str, group_name: str, indices: List[str]) -> List[str]:
+    print(f"\nProcessing group '{group_name}' with {len(indices)} indices (sample: {indices[:3]})")
+    try:
+        return process_group(es_url, group_name, indices)
+    except requests.HTTPError as e:
+        print(f"  HTTP error while processing {group_name}: {e}")
+    except Exception as e:
+        print(f"  Unexpected error while processing {group_name}: {e}")
+    return []
+
+def process_all_groups(es_url: str, workers: int = WORKERS):
+    """
+    Build {group: [fields]} for every index group, running up to `workers`
+    groups at once. Every request goes through the shared rate limiter.
+    Output is keyed in sorted group order so reruns diff cleanly.
+    """
     print("Listing indices and grouping...")
     groups = group_indices_by_normalized_name(es_url)
 
-    final_out: Dict[str, List[str]] = {}
-
-    for group_name, indices in groups.items():
-        print(f"\nProcessing group '{group_name}' with {len(indices)} indices (sample: {indices[:3]})")
-
-        # try pattern "<group>-*"
-        tried_patterns = []
-        success_fields = []
-
-        pattern1 = f"{group_name}-*"
-        tried_patterns.append(pattern1)
-
-        try:
-            print(f"  Trying mapping pattern: {pattern1}")
-            fields = get_all_fields(es_url, pattern1)
-            if not fields:
-                # try datastream pattern ".ds-<group>-*"
-                pattern2 = f".ds-{group_name}-*"
-                tried_patterns.append(pattern2)
-                print(f"  No fields found for {pattern1}, trying datastream pattern: {pattern2}")
-                fields = get_all_fields(es_url, pattern2)
-
-            # fallback: use comma-separated list of indices (limited size to avoid very long URL)
-            if not fields:
-                # limit to 100 indices to avoid huge request URL
-                join_list = indices if len(indices) <= 100 else indices[:100]
-                pattern3 = ",".join(join_list)
-                tried_patterns.append(f"(indices list, {len(join_list)} items)")
-                print(f"  Still empty => trying explicit indices list (first {len(join_list)})")
-                fields = get_all_fields(es_url, pattern3)
-
-            if not fields:
-                print(f"  WARNING: No mapping/fields found for group {group_name} using patterns: {tried_patterns}")
-                final_out[group_name] = []
-                continue
-
-            print(f"  Found {len(fields)} candidate fields (after mapping)")
-
-            # filter fields that actually have data
-            # reuse the same best-effort pattern to run _msearch; prefer pattern1 if it returned mapping
-            # choose pattern_for_search in order of success above
-            pattern_for_search = None
-            for p in [pattern1, f".ds-{group_name}-*", ",".join(indices[:100])]:
-                try:
-                    # quick mapping test: if get_all_fields with p returns something, pick it
-                    test_fields = get_all_fields(es_url, p)
-                    if test_fields:
-                        pattern_for_search = p
-                        break
-                except Exception:
-                    continue
-            if pattern_for_search is None:
-                # fallback to indices list
-                pattern_for_search = ",".join(indices[:100])
-
-            print(f"  Using pattern for existence check: {pattern_for_search}")
-
-            used_fields = filter_fields_that_exist(es_url, pattern_for_search, fields, BATCH)
-            print(f"  {len(used_fields)} fields actually have data for group '{group_name}'")
-            final_out[group_name] = sorted(used_fields)
-        except requests.HTTPError as e:
-            print(f"  HTTP error while processing {group_name}: {e}")
-            final_out[group_name] = []
-        except Exception as e:
-            print(f"  Unexpected error while processing {group_name}: {e}")
-            final_out[group_name] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="group") as pool:
+        futures = {name: pool.submit(_process_group_safe, es_url, name, indices)
+                   for name, indices in groups.items()}
+        final_out: Dict[str, List[str]] = {name: futures[name].result() for name in sorted(futures)}
 
     return final_out
 
 if __name__ == "__main__":
+    # run from the repo root: python -m BackEnd.ELK_build_schema
     out = process_all_groups(ES_URL)
     print("\nResult summary:")
     print(json.dumps(out, indent=2, ensure_ascii=False))
 
-    with open(OUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(out, f, indent=2, ensure_ascii=False)
+    atomic_write_json(OUT_FILE, out)
 
     print(f"\nSaved output to {OUT_FILE}")
@@ -4,45 +4,22 @@ import time
 import os
 import uuid
 from typing import Dict, List, Any, Optional, Union
-import splunklib.client
 from dotenv import load_dotenv
+from BackEnd.schema_catalog import SPLUNK_SCHEMA
+from BackEnd.field_ranker import (get_field_index, select_sources, is_splunk_noise,
+                                  SPLUNK_FIELDS_TOP_K, SPLUNK_MAX_SOURCES, SPLUNK_ALWAYS_FIELDS)
+from BackEnd.splunk_stream import stream_splunk_results, write_ndjson
+from BackEnd.spl_validator import validate_spl, VALIDATE_SPL
+from BackEnd.spl_optimizer import optimize_spl, OPTIMIZE_SPL
+from BackEnd.spl_rewriter import rewrite_spl, SPL_REWRITES
+from BackEnd.result_cache import RESULT_CACHE, RESULT_CACHE_ENABLED
 load_dotenv()
-def generate_unique_filename():
+
+def generate_unique_filename(ext: str = ".json"):
     """Generate a unique filename with timestamp and UUID."""
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     session_id = str(uuid.uuid4())[:8]
-    return f"log_{timestamp}_{session_id}.json"
-
-def get_splunk_connection() -> splunklib.client.Service:
-    """
-    Get a connection to the Splunk service.
-    
-    Returns:
-        splunklib.client.Service: Connected Splunk service
-    """
-    try:
-        # conf = load_config_splunk()
-        username = os.getenv("SPLUNK_USERNAME", "admin")
-
-        print(f"🔌 Connecting to Splunk at {os.getenv("SPLUNK_SCHEME")}://{os.getenv("SPLUNK_HOST")}:{os.getenv("SPLUNK_PORT")} as {username}")
-        verify_ssl = os.getenv("VERIFY_SSL")
-        if isinstance(verify_ssl, str):
-            verify_ssl = verify_ssl.lower() == "true"
-        # Connect to Splunk
-        service = splunklib.client.connect(
-            host=os.getenv("SPLUNK_HOST"),
-            port=os.getenv("SPLUNK_PORT"),
-            username=username,
-            password=os.getenv("SPLUNK_PASSWORD"),
-            scheme=os.getenv("SPLUNK_SCHEME"),
-            verify=verify_ssl
-        )
-        
-        print(f"Connected to Splunk successfully")
-        return service
-    except Exception as e:
-        print(f"Failed to connect to Splunk: {str(e)}")
-        raise
+    return f"log_{timestamp}_{session_id}{ext}"
 
 @tool("Get_index_SPLUNK")
 def Get_index_SPLUNK() -> list:
@@ -52,29 +29,35 @@ def Get_index_SPLUNK() -> list:
     Returns:
     - List of index names
     """
-    filepath = "./docs/Splunk_schema.json"
-    with open (filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    data_index = list(data["indexes"].keys())
-    return data_index
+    return SPLUNK_SCHEMA.indexes()
 
 @tool("Get_sources_fields_SPLUNK")
-def Get_sources_fields_SPLUNK(index_name: str) -> dict:
+def Get_sources_fields_SPLUNK(index_name: str, intent: str = "", top_k: int = SPLUNK_FIELDS_TOP_K,
+                              max_sources: int = SPLUNK_MAX_SOURCES) -> dict:
     """
     Docstring for Get_sources_fields_SPLUNK
     Get list of sources and their fields for a given index from Splunk schema JSON file.
     Arguments:
     - index_name: name of the index
+    - intent: parsed query intent (JSON or keywords). When given, only the
+      max_sources most relevant sources are returned, each with its top_k
+      most relevant fields and without noise fields like date_hour or linecount
+    - top_k: number of ranked fields per source (default SPLUNK_FIELDS_TOP_K)
+    - max_sources: number of sources to return (default SPLUNK_MAX_SOURCES)
     Returns:
     - Dict of sources and their fields for the specified index
     """
-    filepath = "./docs/Splunk_schema.json"
-    with open (filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    if index_name in data["indexes"]:
-        return data["indexes"][index_name]["source"]
-    else:
-        return {}
+    sources = SPLUNK_SCHEMA.index_sources(index_name)
+    if not intent or not sources:
+        return sources
+    version = SPLUNK_SCHEMA.version
+    indexes = {
+        source: get_field_index(("splunk", index_name, source), version,
+                                [f for f in obj["fields"] if not is_splunk_noise(f)])
+        for source, obj in sources.items()
+    }
+    # nothing matched the intent: better a long list than a wrong one
+    return select_sources(indexes, intent, top_k, max_sources, SPLUNK_ALWAYS_FIELDS) or sources
     
 @tool("Search_Splunk")
 def search_splunk(search_query: str, max_results: int = 100):
@@ -88,97 +71,100 @@ def search_splunk(search_query: str, max_results: int = 100):
         max_results: Maximum number of results to return (default: 100)
 
     Returns:
-        List of search results
+        JSON string with the query, saved_file (NDJSON, one result per line), results_count
+        and call (the arguments this call was made with).
+        If the query fails local validation (unknown index/source, missing earliest=,
+        (?<name>) instead of (?P<name>) in rex), no search is run and the JSON has
+        "error": "invalid_query" with the problems in "detail". Fields missing from the
+        schema are only reported in "warnings".
+        Repeating the same query within a few minutes returns the earlier saved_file with
+        "cached": true instead of searching again.
+        Before running, raw "*value*" terms may be tightened (listed in "optimizations"):
+        IPs and numbers become TERM(value) only on sources whose values sit alone between
+        major breakers (term_safe in docs/spl_rewrite_rules.json), and the wildcards are
+        dropped only from values that start and end with a minor breaker ("*/tmp/*").
     """
+    # the arguments as given, before cleanup and rewriting, so the call can be replayed
+    call = {"search_query": search_query, "max_results": max_results}
+
     # Clean up escaped characters from JSON/LLM output
     search_query = search_query.replace('\\"', '"')  # Unescape double quotes
     search_query = search_query.replace('\\n', ' ')  # Replace newlines with space
     search_query = search_query.strip()
     
-    if not search_query.startswith("search "):
+    # generating commands (| tstats, | inputlookup) must keep their leading pipe
+    if not search_query.startswith("search ") and not search_query.startswith("|"):
         search_query = f"search {search_query}"
 
-    # Auto-add wildcard search for Sysmon/XmlWinEventLog sources
-    sysmon_sources = [
-        "XmlWinEventLog:Microsoft-Windows-Sysmon/Operational",
-        "XmlWinEventLog:Security",
-        "XmlWinEventLog:System",
-        "XmlWinEventLog:Application"
-    ]
-    needs_wildcard = any(src in search_query for src in sysmon_sources)
-    
-    if needs_wildcard:
-        import re
-        
-        # Fields that need wildcard search (not properly indexed in raw XML)
-        spath_fields = ['process_name', 'cmdline', 'parent_process', 'parent_cmdline', 
-                        'dest_ip', 'dest_port', 'src_ip', 'src_port', 'user']
-        
-        # Extract filters for these fields and convert to raw text wildcard search
-        raw_text_filters = []
-        base_query = search_query
-        
-        for field in spath_fields:
-            # Match field="value" or field=value patterns
-            pattern = rf'\s+{field}="([^"]+)"|\s+{field}=(\S+)'
-            match = re.search(pattern, base_query)
-            if match:
-                value = match.group(1) or match.group(2)
-                # Remove from base query
-                base_query = re.sub(pattern, '', base_query, count=1)
-                
-                # Clean value (remove existing wildcards)
-                clean_value = value.strip('*')
-                
-                # Add raw text wildcard search
-                raw_text_filters.append(f'"*{clean_value}*"')
-        
-        search_query = base_query.strip()
-        
-        # Insert raw text filters into base query
-        if raw_text_filters:
-            if " | " in search_query:
-                parts = search_query.split(" | ", 1)
-                search_query = parts[0] + " " + " ".join(raw_text_filters) + " | " + parts[1]
-            else:
-                search_query = search_query + " " + " ".join(raw_text_filters)
+    # lint against the schema before spending a search slot on it
+    warnings = []
+    if VALIDATE_SPL:
+        report = validate_spl(search_query, extra_fields=SPL_REWRITES.fields())
+        warnings = report["warnings"]
+        if not report["valid"]:
+            print(f"❌ Query rejected by local validation: {json.dumps(report['errors'], ensure_ascii=False)}")
+            return json.dumps({"query": search_query, "error": "invalid_query", "detail": report["errors"],
+                               "warnings": warnings}, ensure_ascii=False)
+        for w in warnings:
+            print(f"⚠️  {w.get('warning')}: {w.get('field', '')} {w.get('detail')}")
+
+    # fields the source keeps only in raw text (e.g. XML <Data>) -> raw-text terms
+    search_query, rewrites, term_safe = rewrite_spl(search_query)
+    for change in rewrites:
+        print(f"🛠️  Rewrite: {change}")
+
+    optimizations = []
+    if OPTIMIZE_SPL:
+        before = search_query
+        search_query, optimizations = optimize_spl(search_query, term_safe=term_safe)
+        for change in optimizations:
+            print(f"🛠️  Optimize: {change}")
+        if optimizations:
+            print(f"   before: {before}\n   after:  {search_query}")
 
-    print(f"🔍 Executing Splunk search...{search_query}")
     if not search_query:
         raise ValueError("Search query cannot be empty")
 
-    try:
-        service = get_splunk_connection()
+    # same query within the cache TTL / time bucket: reuse the saved file
+    cache_key = None
+    if RESULT_CACHE_ENABLED:
+        cache_key = RESULT_CACHE.spl_key(search_query, max_results)
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            cached["cached"] = True
+            cached["call"] = call
+            print(f"♻️  Result cache hit: {cached.get('saved_file')} ({RESULT_CACHE.stats()})")
+            return json.dumps(cached, ensure_ascii=False)
 
-        # Create the search job
-        kwargs_search = {
-            "preview": False,
-            "exec_mode": "blocking"
-        }
+    print(f"🔍 Executing Splunk search...{search_query}")
 
-        job = service.jobs.create(search_query, **kwargs_search)
-        
-        # Get the results
-        result_stream = job.results(output_mode='json', count=max_results)
-        results_data = json.loads(result_stream.read().decode('utf-8'))
-        #save results to a file
-        out = {"query": search_query}
-        os.makedirs('logs', exist_ok=True)
-        filename = generate_unique_filename()
-        filepath = os.path.join('logs', filename)
-        data = results_data.get('results', [])
-        if not data:
+    try:
+        # Stream rows straight from the export endpoint into an NDJSON file,
+        # so memory stays flat and rows are written while the search runs
+        out = {"query": search_query, "call": call}
+        if rewrites:
+            out["rewrites"] = rewrites
+        if optimizations:
+            out["original_query"] = before
+            out["optimizations"] = optimizations
+        if warnings:
+            out["warnings"] = warnings
+        filepath = os.path.join('logs', generate_unique_filename(ext=".ndjson"))
+        results_count = write_ndjson(stream_splunk_results(search_query, max_results=max_results), filepath)
+        if not results_count:
             print("No results found for the query")
             out["saved_file"] = None
             out["message"] = "No data found for the query"
             out["results_count"] = 0
+            if cache_key:
+                RESULT_CACHE.put(cache_key, "splunk", out)
             return json.dumps(out, ensure_ascii=False)
         else:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=4)
             print(f"Search completed successfully. Results saved to {filepath}")
             out["saved_file"] = filepath
-            out["results_count"] = len(data)
+            out["results_count"] = results_count
+            if cache_key:
+                RESULT_CACHE.put(cache_key, "splunk", out)
             return json.dumps(out, ensure_ascii=False)
 
     except Exception as e:
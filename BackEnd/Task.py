@@ -5,29 +5,6 @@ from BackEnd.query import Query_Elasticsearch, Get_fields_index_ELK, Get_index_E
 from BackEnd.Spunk_tools import Get_index_SPLUNK, Get_sources_fields_SPLUNK, search_splunk
 
 
-SearchQdrant = Task(
-    description="""
-Search the Qdrant vector database for relevant query examples and documentation.
-
-INPUT: User query from {messages}
-
-ACTIONS:
-1. Use QdrantSearch_ELK tool to perform semantic search
-2. Extract query text from the parsed intent (keywords, target, conditions)
-3. Return relevant examples that can help build the final query
-
-The search results may contain:
-- Example Elasticsearch/Splunk queries
-- Field mappings and documentation
-- Use case patterns
-
-Return the raw search results for use by downstream tasks.
-""",
-    expected_output="Qdrant search results containing relevant query examples and documentation.",
-    agent=NL2IOC,
-    tools=[QdrantSearch_ELK],
-)
-
 NL2IOC_task = Task(
     description="""
 Parse the user's natural language query and extract structured information.
@@ -54,6 +31,32 @@ RULES:
     agent=NL2IOC
 )
 
+SearchQdrant = Task(
+    description="""
+Search the Qdrant vector database for relevant query examples and documentation.
+
+INPUT: User query from {messages}
+
+ACTIONS:
+1. Use QdrantSearch_ELK tool to perform semantic search
+2. Extract query text from the parsed intent (keywords, target, conditions)
+3. Return relevant examples that can help build the final query
+
+The search results may contain:
+- Example Elasticsearch/Splunk queries
+- Field mappings and documentation
+- Use case patterns
+
+Return the raw search results for use by downstream tasks.
+""",
+    expected_output="Qdrant search results containing relevant query examples and documentation.",
+    agent=NL2IOC,
+    tools=[QdrantSearch_ELK],
+    # explicit so the intent still arrives when the NL2IOC fast path drops NL2IOC_task;
+    # run_elk_agent adds Get_Index_fields_task for its copy
+    context=[NL2IOC_task],
+)
+
 Get_Index_fields_task = Task(
     description="""
 Select the appropriate Elasticsearch index and retrieve its fields based on the parsed query intent.
@@ -64,7 +67,8 @@ STEPS:
    - Windows events (PowerShell, login, process) → "windows" or "winlogbeat"
    - Network/Firewall events → "filebeat" 
    - Linux events → "linux" or "auditbeat"
-3. Call Get_fields_index_ELK(index_name="<selected_index>") to get fields
+3. Call Get_fields_index_ELK(index_name="<selected_index>", intent="<parsed intent JSON from context>")
+   to get the fields most relevant to the query (pass top_k=<n> for more)
 4. Return the index name and its fields
 
 OUTPUT FORMAT:
@@ -111,6 +115,8 @@ STEPS:
        size=200,
        only_source=True
    )
+   For investigations over several days that may return more than 10000 hits,
+   add stream=True to page through all results into an NDJSON file.
 
 EXAMPLE:
 Query_Elasticsearch(
@@ -128,13 +134,18 @@ Query_Elasticsearch(
     only_source=True
 )
 
+If the tool returns {"error": "invalid_query", ...}, the query was rejected locally before reaching
+Elasticsearch: replace each unknown field with one of its "suggestions" (or another field from
+Get_Index_fields_task output) and call Query_Elasticsearch again.
+
 Return the COMPLETE JSON output from the tool as-is, do not extract or modify any part.
 """,
     expected_output="""Return the EXACT JSON string from Query_Elasticsearch tool output. Must be valid JSON containing:
 - "index_pattern": the index used
 - "query": the query body executed  
 - "saved_file": path to saved results file (if results exist)
-Example: {"index_pattern": ".ds-filebeat-*", "query": {...}, "saved_file": "logs/elk_log_xxx.json"}
+- "call": the arguments Query_Elasticsearch was called with
+Example: {"index_pattern": ".ds-filebeat-*", "query": {...}, "call": {...}, "saved_file": "logs/elk_log_xxx.json"}
 Do NOT return just the file path - return the complete JSON object.""",
     context=[Get_Index_fields_task, SearchQdrant, NL2IOC_task],
     tools=[Query_Elasticsearch],
@@ -152,7 +163,8 @@ STEPS:
    - Windows events → "wineventlog" or "sysmon"
    - Network events → "firewall" or "network"
    - Linux events → "linux" or "syslog"
-3. Call Get_sources_fields_SPLUNK(index_name="<selected>") to get sources and fields
+3. Call Get_sources_fields_SPLUNK(index_name="<selected>", intent="<parsed intent JSON from context>")
+   to get the most relevant sources and their fields (pass top_k / max_sources for more)
 4. Select the most relevant source for the query
 
 OUTPUT FORMAT:
@@ -228,6 +240,10 @@ The tool will:
 - Save results to a log file
 - Return the file path and query info
 
+If the tool returns "error": "invalid_query", the query was rejected locally before reaching
+Splunk: fix each problem listed in "detail" (use the suggested index/source/field names) and
+call search_splunk again.
+
 Return the tool output as-is.
 """,
     expected_output="Splunk search results with saved file path.",
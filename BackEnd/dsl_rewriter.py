@@ -0,0 +1,239 @@
+import copy
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from BackEnd.ELK_build_schema import fields_from_caps
+from BackEnd.dsl_validator import iter_field_refs
+from BackEnd.es_client import get_es_session
+from BackEnd.field_ranker import ELK_ALWAYS_FIELDS
+
+TIMEOUT = 30
+REWRITE_QUERIES = os.getenv("ES_REWRITE_QUERIES", "true").lower() == "true"
+FIELD_TYPES_TTL = int(os.getenv("ES_FIELD_TYPES_TTL", "600"))          # seconds
+TRACK_TOTAL_HITS = int(os.getenv("ES_TRACK_TOTAL_HITS", "1000"))       # 0 = leave ES default
+# fields kept in _source besides the ones the query references ("" = don't restrict _source)
+SOURCE_CONTEXT_FIELDS = [f.strip() for f in os.getenv(
+    "ES_SOURCE_CONTEXT_FIELDS",
+    "event.code,event.action,event.outcome,event.category,winlog.event_id,winlog.event_data.*,"
+    "process.*,user.name,source.ip,source.port,destination.ip,destination.port,file.path,"
+    "rule.name,suricata.eve.alert.*,url.original,dns.question.name",
+).split(",") if f.strip()]
+
+# leaf queries that only filter: in bool.must they cost scoring for nothing
+FILTER_ONLY_QUERIES = {"term", "terms", "range", "exists", "prefix", "wildcard", "regexp", "ids"}
+EXACT_TYPES = {"keyword", "constant_keyword", "long", "integer", "short", "byte", "double", "float",
+               "half_float", "scaled_float", "unsigned_long", "ip", "date", "date_nanos", "boolean"}
+TERM_LEVEL_PARAMS = {"value", "wildcard", "boost", "case_insensitive"}
+
+_types_lock = threading.Lock()
+_types_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, str]]] = {}
+
+
+def get_field_types(es_url: str, index_pattern: str) -> Dict[str, str]:
+    """
+    {field: type} for an index pattern from _field_caps, cached for
+    ES_FIELD_TYPES_TTL seconds. Returns {} if the cluster can't be asked;
+    type-dependent rewrites are then skipped.
+    """
+    key = (es_url, index_pattern)
+    now = time.monotonic()
+    cached = _types_cache.get(key)
+    if cached and now - cached[0] < FIELD_TYPES_TTL:
+        return cached[1]
+    try:
+        r = get_es_session().get(
+            f"{es_url.rstrip('/')}/{index_pattern}/_field_caps",
+            params={"fields": "*", "ignore_unavailable": "true", "allow_no_indices": "true"},
+            timeout=TIMEOUT,
+        )
+        r.raise_for_status()
+        types = fields_from_caps(r.json())
+    except requests.RequestException as e:
+        print(f"Could not load field types for {index_pattern}: {e}")
+        return cached[1] if cached else {}
+    with _types_lock:
+        _types_cache[key] = (now, types)
+    return types
+
+
+def _wildcard_value(body) -> Tuple[Optional[str], dict]:
+    """(pattern, other params) of a wildcard query's field body, or (None, {}) if it can't be rewritten."""
+    if isinstance(body, str):
+        return body, {}
+    if isinstance(body, dict) and set(body) <= TERM_LEVEL_PARAMS:
+        value = body.get("value", body.get("wildcard"))
+        if isinstance(value, str):
+            return value, {k: v for k, v in body.items() if k in ("boost", "case_insensitive")}
+    return None, {}
+
+
+class _Rewriter:
+    def __init__(self, types: Dict[str, str]):
+        self.types = types
+        self.changes: List[str] = []
+
+    def field_type(self, field: str) -> Optional[str]:
+        return self.types.get(field)
+
+    # ---------- leaf rewrites ----------
+    def leaf(self, clause: dict) -> dict:
+        if len(clause) != 1:
+            return clause
+        qtype, body = next(iter(clause.items()))
+        if qtype != "wildcard" or not isinstance(body, dict) or len(body) != 1:
+            return clause
+
+        field, fbody = next(iter(body.items()))
+        pattern, params = _wildcard_value(fbody)
+        if pattern is None or "?" in pattern or "\\" in pattern:
+            return clause
+        inner = pattern.strip("*")
+
+        if "*" not in pattern:
+            self.changes.append(f"wildcard({field}) without wildcards -> term")
+            return {"term": {field: {"value": pattern, **params} if params else pattern}}
+        if "*" in inner or not inner:
+            return clause
+        if not pattern.startswith("*"):
+            self.changes.append(f"wildcard({field}:{pattern}) -> prefix")
+            return {"prefix": {field: {"value": inner, **params} if params else inner}}
+        # *value / *value*: a substring match has no token-level equivalent
+        # (powershell.exe is one token), only a wildcard-typed copy of the
+        # same value answers it without scanning every term
+        target = f"{field}.wildcard"
+        if self.field_type(field) != "wildcard" and self.field_type(target) == "wildcard":
+            self.changes.append(f"wildcard({field}:{pattern}) -> wildcard({target}) (wildcard subfield)")
+            return {"wildcard": {target: {"value": pattern, **params} if params else pattern}}
+        return clause
+
+    # ---------- bool rewrites ----------
+    def node(self, clause):
+        if isinstance(clause, list):
+            return [self.node(c) for c in clause]
+        if not isinstance(clause, dict):
+            return clause
+        if "bool" in clause and isinstance(clause["bool"], dict) and len(clause) == 1:
+            return {"bool": self.bool(clause["bool"])}
+        for key in ("constant_score", "nested"):
+            if key in clause and isinstance(clause[key], dict):
+                inner = dict(clause[key])
+                sub = "filter" if key == "constant_score" else "query"
+                if sub in inner:
+                    inner[sub] = self.node(inner[sub])
+                return {key: inner}
+        return self.leaf(clause)
+
+    def _is_exact(self, clause: dict) -> bool:
+        if not isinstance(clause, dict) or len(clause) != 1:
+            return False
+        qtype, body = next(iter(clause.items()))
+        if qtype in FILTER_ONLY_QUERIES:
+            return True
+        if qtype in ("match", "match_phrase") and isinstance(body, dict) and len(body) == 1:
+            field = next(iter(body))
+            return self.field_type(field) in EXACT_TYPES or field.endswith(".keyword")
+        return False
+
+    def bool(self, body: dict) -> dict:
+        out = dict(body)
+        for key in ("must", "filter", "should", "must_not"):
+            if key in out:
+                items = out[key] if isinstance(out[key], list) else [out[key]]
+                out[key] = [self.node(c) for c in items]
+
+        # non-scoring clauses: must -> filter
+        if out.get("must"):
+            keep = [c for c in out["must"] if not self._is_exact(c)]
+            moved = [c for c in out["must"] if self._is_exact(c)]
+            if moved:
+                out["filter"] = list(out.get("filter") or []) + moved
+                names = ", ".join(sorted({next(iter(c)) for c in moved}))
+                self.changes.append(f"moved {len(moved)} clause(s) ({names}) from must to filter")
+                if keep:
+                    out["must"] = keep
+                else:
+                    del out["must"]
+
+        # should: several term clauses on one field -> one terms clause
+        msm = out.get("minimum_should_match")
+        if out.get("should") and msm in (None, 1, "1"):
+            out["should"] = self._collapse_terms(out["should"])
+        return out
+
+    @staticmethod
+    def _plain_term(clause) -> Optional[Tuple[str, object]]:
+        """(field, value) of a term clause without extra params, else None."""
+        if not (isinstance(clause, dict) and set(clause) == {"term"}
+                and isinstance(clause["term"], dict) and len(clause["term"]) == 1):
+            return None
+        field, value = next(iter(clause["term"].items()))
+        if isinstance(value, dict):
+            if set(value) != {"value"}:
+                return None
+            value = value["value"]
+        return field, value
+
+    def _collapse_terms(self, clauses: List[dict]) -> List[dict]:
+        by_field: Dict[str, List[object]] = {}
+        for c in clauses:
+            term = self._plain_term(c)
+            if term:
+                by_field.setdefault(term[0], []).append(term[1])
+        merge = {f for f, values in by_field.items() if len(values) > 1}
+        if not merge:
+            return clauses
+        out, emitted = [], set()
+        for c in clauses:
+            term = self._plain_term(c)
+            field = term[0] if term else None
+            if field in merge:
+                if field not in emitted:
+                    emitted.add(field)
+                    out.append({"terms": {field: list(dict.fromkeys(by_field[field]))}})
+                    self.changes.append(f"collapsed {len(by_field[field])} should term({field}) clauses into terms")
+                continue
+            out.append(c)
+        return out
+
+
+def rewrite_query(es_url: str, index_pattern: str, query_body: dict) -> Tuple[dict, List[str], List[str]]:
+    """
+    Rewrite an agent-written query DSL into a cheaper equivalent.
+
+    - exact-match clauses (term, range, exists, wildcard, match on keyword
+      fields, ...) move from bool.must to bool.filter
+    - wildcard without '*' becomes term and 'value*' becomes prefix; a
+      leading '*' is kept, and only moved to the field's .wildcard subfield
+      when the mapping has one of type wildcard
+    - several should term clauses on one field become a single terms clause
+
+    Returns (new query, list of changes, fields the query references). The
+    input is not modified.
+    """
+    types = get_field_types(es_url, index_pattern)
+    rw = _Rewriter(types)
+    new_query = rw.node(copy.deepcopy(query_body))
+    fields = [f[:-len(".keyword")] if f.endswith(".keyword") else f
+              for _, _, f, _ in iter_field_refs(new_query) if f]
+    return new_query, rw.changes, list(dict.fromkeys(fields))
+
+
+def search_body_options(referenced_fields: List[str], size: int) -> Tuple[dict, List[str]]:
+    """
+    Extra top-level search options: a track_total_hits cap and _source
+    includes built from the referenced fields plus ELK_ALWAYS_FIELDS and
+    SOURCE_CONTEXT_FIELDS. Returns (options, change descriptions).
+    """
+    options, changes = {}, []
+    if TRACK_TOTAL_HITS:
+        options["track_total_hits"] = max(TRACK_TOTAL_HITS, int(size))
+        changes.append(f"track_total_hits={options['track_total_hits']}")
+    if SOURCE_CONTEXT_FIELDS:
+        includes = list(dict.fromkeys(list(ELK_ALWAYS_FIELDS) + referenced_fields + SOURCE_CONTEXT_FIELDS))
+        options["_source"] = {"includes": includes}
+        changes.append(f"_source limited to {len(includes)} field patterns")
+    return options, changes
@@ -0,0 +1,176 @@
+import difflib
+import fnmatch
+import json
+import os
+from typing import List, Optional, Tuple
+
+from BackEnd.es_indices import normalize_index_name
+from BackEnd.schema_catalog import ELK_SCHEMA
+
+VALIDATE_QUERIES = os.getenv("ES_VALIDATE_QUERIES", "true").lower() == "true"
+
+# query type -> how its field is given
+FIELD_KEY_QUERIES = {            # {"term": {"<field>": ...}}
+    "term", "terms", "match", "match_phrase", "match_phrase_prefix", "match_bool_prefix",
+    "prefix", "wildcard", "regexp", "fuzzy", "range", "terms_set", "geo_distance",
+    "geo_bounding_box", "geo_shape", "intervals", "span_term",
+}
+FIELD_PARAM_QUERIES = {"exists"}                                       # {"exists": {"field": "<field>"}}
+FIELDS_PARAM_QUERIES = {"multi_match", "query_string", "simple_query_string", "more_like_this"}
+COMPOUND_QUERIES = {
+    "bool": ("must", "filter", "should", "must_not"),
+    "constant_score": ("filter",),
+    "dis_max": ("queries",),
+    "function_score": ("query",),
+    "boosting": ("positive", "negative"),
+    "nested": ("query",),
+    "has_child": ("query",),
+    "has_parent": ("query",),
+}
+NO_FIELD_QUERIES = {"match_all", "match_none", "ids", "script", "script_score", "wrapper", "percolate"}
+# keys that sit next to the field inside a field-keyed query
+QUERY_OPTION_KEYS = {"boost", "_name", "minimum_should_match", "format", "time_zone", "relation"}
+
+DISCOURAGED_FIELDS = {"message": "the 'message' field has no meaningful data for filtering; use a structured field"}
+
+
+def schema_groups_for_pattern(index_pattern: str) -> Tuple[List[str], List[str]]:
+    """
+    Map each comma separated piece of an index pattern to an ELK schema group
+    ("windows-*" -> windows, ".ds-filebeat-*" -> filebeat). Returns
+    (groups found in the schema, pieces that match no group).
+    """
+    groups, unknown = [], []
+    for piece in (p.strip() for p in index_pattern.split(",")):
+        if not piece:
+            continue
+        group = normalize_index_name(piece)
+        if ELK_SCHEMA.has_index(group):
+            groups.append(group)
+        else:
+            unknown.append(piece)
+    return groups, unknown
+
+
+def iter_field_refs(node, path: str = "query"):
+    """
+    Yield (path, query_type, field, value) for every field reference in a
+    query DSL tree. Unknown query types are yielded with field=None so the
+    caller can report them.
+    """
+    if isinstance(node, list):
+        for i, item in enumerate(node):
+            yield from iter_field_refs(item, f"{path}[{i}]")
+        return
+    if not isinstance(node, dict):
+        return
+
+    for qtype, body in node.items():
+        here = f"{path}.{qtype}"
+        if qtype in COMPOUND_QUERIES:
+            if isinstance(body, dict):
+                if qtype == "nested" and body.get("path"):
+                    yield here, qtype, body["path"], None
+                for key in COMPOUND_QUERIES[qtype]:
+                    if key in body:
+                        yield from iter_field_refs(body[key], f"{here}.{key}")
+                for fn in body.get("functions", []) if qtype == "function_score" else []:
+                    if isinstance(fn, dict) and "filter" in fn:
+                        yield from iter_field_refs(fn["filter"], f"{here}.functions.filter")
+        elif qtype in FIELD_KEY_QUERIES:
+            if isinstance(body, dict):
+                for field, value in body.items():
+                    if field not in QUERY_OPTION_KEYS:
+                        yield here, qtype, field, value
+        elif qtype in FIELD_PARAM_QUERIES:
+            if isinstance(body, dict) and body.get("field"):
+                yield here, qtype, body["field"], None
+        elif qtype in FIELDS_PARAM_QUERIES:
+            if isinstance(body, dict):
+                fields = list(body.get("fields") or [])
+                if body.get("default_field"):
+                    fields.append(body["default_field"])
+                for field in fields:
+                    yield here, qtype, str(field).split("^", 1)[0], body.get("query")
+                if not fields and qtype in ("query_string", "simple_query_string"):
+                    yield here, qtype, "", body.get("query")
+        elif qtype not in NO_FIELD_QUERIES:
+            yield here, qtype, None, body
+
+
+def _base_field(field: str) -> str:
+    return field[:-len(".keyword")] if field.endswith(".keyword") else field
+
+
+def _leading_wildcard(qtype: str, value) -> bool:
+    if isinstance(value, dict):
+        value = value.get("value", value.get("wildcard", value.get("query")))
+    if not isinstance(value, str):
+        return False
+    if qtype == "wildcard":
+        return value[:1] in ("*", "?")
+    if qtype == "regexp":
+        return value.startswith(".*") or value.startswith(".+")
+    if qtype in ("query_string", "simple_query_string"):
+        return any(tok[:1] in ("*", "?") for tok in value.replace(":", " ").split())
+    return False
+
+
+def validate_query(index_pattern: str, query_body) -> dict:
+    """
+    Check a query DSL body against the cached ELK schema without touching the cluster.
+
+    Returns {"valid": bool, "errors": [...], "warnings": [...]}. Errors are
+    unknown query types and fields that are not in the schema groups the
+    index pattern maps to (".keyword" variants are accepted); each comes
+    with close matches from the schema. Leading wildcards and the 'message'
+    field are reported as warnings. Fields cannot be checked when a pattern
+    piece maps to no schema group; that is a warning, not an error.
+    """
+    errors: List[dict] = []
+    warnings: List[dict] = []
+
+    if isinstance(query_body, str):
+        try:
+            query_body = json.loads(query_body)
+        except ValueError as e:
+            return {"valid": False, "errors": [{"error": "invalid_json", "detail": str(e)}], "warnings": []}
+    if not isinstance(query_body, dict) or not query_body:
+        return {"valid": False, "errors": [{"error": "invalid_query", "detail": "query_body must be a non-empty object"}],
+                "warnings": []}
+
+    groups, unknown = schema_groups_for_pattern(index_pattern)
+    known: Optional[frozenset] = None
+    if unknown:
+        warnings.append({"warning": "no_schema", "detail": f"no schema group for {unknown}; fields not checked"})
+    elif groups:
+        known = frozenset().union(*(ELK_SCHEMA.field_set(g) for g in groups))
+
+    for path, qtype, field, value in iter_field_refs(query_body):
+        if field is None:
+            detail = f"'{qtype}' is not an Elasticsearch query type"
+            if qtype == "query":
+                detail += "; pass only the query clause, e.g. {\"bool\": {...}}"
+            errors.append({"path": path, "error": "unknown_query_type", "detail": detail})
+            continue
+        if _leading_wildcard(qtype, value):
+            warnings.append({"path": path, "field": field, "warning": "leading_wildcard",
+                             "detail": "a leading wildcard scans every term of the field; anchor the pattern if possible"})
+        if not field:
+            continue
+        base = _base_field(field)
+        if base in DISCOURAGED_FIELDS:
+            warnings.append({"path": path, "field": field, "warning": "discouraged_field",
+                             "detail": DISCOURAGED_FIELDS[base]})
+        if known is None:
+            continue
+        if "*" in base:
+            if not any(fnmatch.fnmatchcase(f, base) for f in known):
+                errors.append({"path": path, "field": field, "error": "unknown_field",
+                               "detail": f"pattern matches no field in {groups}"})
+        elif base not in known:
+            errors.append({"path": path, "field": field, "error": "unknown_field",
+                           "detail": f"field not in schema for {groups}",
+                           "suggestions": difflib.get_close_matches(base, known, n=3, cutoff=0.6)})
+
+    return {"valid": not errors, "errors": errors, "warnings": warnings}
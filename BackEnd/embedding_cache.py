@@ -0,0 +1,111 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Callable, List, Optional
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+
+RE_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize, lowercase and collapse whitespace so trivial variants share a key."""
+    text = unicodedata.normalize("NFC", text or "")
+    return RE_SPACES.sub(" ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by SQLite with LRU eviction.
+
+    Entries are keyed by sha256(model, task, normalized text) and stored as
+    float32 blobs. A single connection is shared behind a lock, which is
+    plenty for the handful of lookups per agent run.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT, task TEXT, vector BLOB, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(text: str, model: str, task: str) -> str:
+        return hashlib.sha256(f"{model}\x1f{task}\x1f{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, model: str, task: str) -> Optional[List[float]]:
+        key = self.make_key(text, model, task)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+        return array("f", row[0]).tolist()
+
+    def put(self, text: str, model: str, task: str, vector: List[float]) -> None:
+        key = self.make_key(text, model, task)
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, task, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, task, blob, time.time()),
+            )
+            self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            excess = self._count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+            conn.commit()
+
+    def get_or_compute(self, text: str, model: str, task: str,
+                       compute: Callable[[str], List[float]]) -> List[float]:
+        vector = self.get(text, model, task)
+        if vector is not None:
+            return vector
+        vector = compute(text)
+        self.put(text, model, task, vector)
+        return vector
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self._count,
+        }
+
+
+EMBEDDING_CACHE = EmbeddingCache()
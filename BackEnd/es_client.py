@@ -0,0 +1,60 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ES_POOL_SIZE = int(os.getenv("ES_POOL_SIZE", "20"))          # max keep-alive connections per host
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
+ES_RETRY_BACKOFF = float(os.getenv("ES_RETRY_BACKOFF", "0.5"))  # 0.5s, 1s, 2s, ...
+ES_RETRY_STATUS = (429, 503)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=ES_MAX_RETRIES,
+        connect=ES_MAX_RETRIES,
+        read=0,                      # never replay a request the cluster may already be running
+        status=ES_MAX_RETRIES,
+        backoff_factor=ES_RETRY_BACKOFF,
+        status_forcelist=ES_RETRY_STATUS,
+        # _search / _msearch / _pit are POSTs but read-only, safe to retry on 429/503
+        allowed_methods=frozenset(["GET", "HEAD", "POST", "DELETE"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=ES_POOL_SIZE, pool_maxsize=ES_POOL_SIZE,
+                          max_retries=retry, pool_block=False)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+def get_es_session() -> requests.Session:
+    """
+    Return the process-wide pooled session used for all Elasticsearch calls.
+
+    The session keeps connections alive between tool calls, asks for gzip
+    responses and retries with exponential backoff on 429/503.
+    requests.Session is safe to share between threads for plain requests.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
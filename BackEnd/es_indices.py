@@ -0,0 +1,313 @@
+import fnmatch
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from BackEnd.es_client import get_es_session
+
+TIMEOUT = 30
+INDEX_CACHE_TTL = int(os.getenv("ES_INDEX_CACHE_TTL", "300"))      # seconds
+PRUNE_SLACK = timedelta(hours=int(os.getenv("ES_PRUNE_SLACK_HOURS", "24")))  # timezone / late data margin
+PRUNE_MAX_INDICES = int(os.getenv("ES_PRUNE_MAX_INDICES", "50"))    # keep the wildcard beyond this
+PRUNE_MAX_URL_CHARS = 3000      # ES rejects request lines over 4kb by default
+
+RE_INDEX_DATE = re.compile(r'(\d{4})[.\-](\d{2})[.\-](\d{2})')
+RE_DS_GENERATION = re.compile(r'-\d{6}$')
+RE_DATE_MATH = re.compile(r'^now(?P<ops>(?:[+-]\d+[yMwdhHms])*)(?:/(?P<round>[yMwdhHms]))?$')
+RE_DATE_OP = re.compile(r'([+-])(\d+)([yMwdhHms])')
+
+# (shortest, longest) length of a date math unit; months and years vary
+_UNIT_DELTA = {
+    "s": (timedelta(seconds=1),) * 2,
+    "m": (timedelta(minutes=1),) * 2,
+    "h": (timedelta(hours=1),) * 2,
+    "H": (timedelta(hours=1),) * 2,
+    "d": (timedelta(days=1),) * 2,
+    "w": (timedelta(weeks=1),) * 2,
+    "M": (timedelta(days=28), timedelta(days=31)),
+    "y": (timedelta(days=365), timedelta(days=366)),
+}
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, Tuple[float, dict]] = {}
+
+
+# ---------- concrete index listing (cached) ----------
+def list_indices_with_dates(es_url: str) -> dict:
+    """
+    Return {"indices": [{"index", "series", "date", "datastream"}], "targets": set}
+    cached for ES_INDEX_CACHE_TTL seconds.
+
+    "targets" holds data stream and alias names: a wildcard that matches one
+    of them resolves to indices we cannot see by name, so it is never pruned.
+    """
+    now = time.monotonic()
+    cached = _cache.get(es_url)
+    if cached and now - cached[0] < INDEX_CACHE_TTL:
+        return cached[1]
+
+    with _cache_lock:
+        cached = _cache.get(es_url)
+        if cached and now - cached[0] < INDEX_CACHE_TTL:
+            return cached[1]
+        session = get_es_session()
+        base = es_url.rstrip('/')
+        r = session.get(f"{base}/_cat/indices?h=index,creation.date&format=json&expand_wildcards=all",
+                        timeout=TIMEOUT)
+        r.raise_for_status()
+        entries = [_describe_index(item) for item in r.json() if "index" in item]
+
+        targets = set()
+        r = session.get(f"{base}/_cat/aliases?h=alias&format=json", timeout=TIMEOUT)
+        r.raise_for_status()
+        targets.update(item["alias"] for item in r.json() if "alias" in item)
+        r = session.get(f"{base}/_data_stream?filter_path=data_streams.name", timeout=TIMEOUT)
+        if r.ok:
+            targets.update(ds["name"] for ds in r.json().get("data_streams", []))
+
+        listing = {"indices": entries, "targets": targets}
+        _cache[es_url] = (now, listing)
+        return listing
+
+
+def _describe_index(item: dict) -> dict:
+    name = item["index"]
+    datastream = name.startswith(".ds-")
+    date = None
+    m = RE_INDEX_DATE.search(name)
+    if m:
+        try:
+            date = datetime(int(m.group(1)), int(m.group(2)), int(m.group(3)), tzinfo=timezone.utc)
+        except ValueError:
+            date = None
+    if date is None and datastream and item.get("creation.date"):
+        # backing index without a date in its name: rollover time is its start
+        date = datetime.fromtimestamp(int(item["creation.date"]) / 1000, tz=timezone.utc)
+
+    series = RE_INDEX_DATE.sub("{date}", name)
+    if datastream:
+        series = RE_DS_GENERATION.sub("", series)
+    return {"index": name, "series": series, "date": date, "datastream": datastream}
+
+
+# ---------- index name normalization ----------
+# the schema builder and the query validator group indices by this name
+COMMON_ALIAS = {
+    "winlogbeat": "windows",
+    "windows": "windows",
+    "filebeat": "filebeat",
+    "metricbeat": "metricbeat",
+    "auditbeat": "auditbeat",
+    "zeek": "zeek",
+    "suricata": "suricata",
+    "packetbeat": "packetbeat",
+    "panw": "panw",
+    "cisco": "cisco",
+    "iis": "windows",
+    "syslog": "syslog",
+}
+
+RE_DS_PREFIX = re.compile(r'^\.ds-')
+RE_VERSION_SEG = re.compile(r'-(?:\d+\.)+\d+(?:-|$)')    # -8.14.3- or -8.14.3$
+RE_DATE_PATTERNS = [
+    re.compile(r'\{\%.*?\%\}'),                          # {%time%} or similar
+    re.compile(r'\d{4}[.\-]\d{2}[.\-]\d{2}'),            # 2025.01.01 or 2025-01-01
+    re.compile(r'^\*$'),                                 # wildcard
+]
+
+
+def normalize_index_name(index: str) -> str:
+    original = index
+    name = index.lstrip('.')
+
+    # datastream pattern: .ds-<name>-<version>-...
+    if index.startswith(".ds-") or name.startswith("ds-"):
+        # remove .ds- prefix then take tokens
+        name_no_ds = RE_DS_PREFIX.sub('', index).lstrip('.')
+        tokens = [t for t in re.split(r'[-_.]', name_no_ds) if t]
+        if tokens:
+            base = tokens[0].lower()
+            base = RE_VERSION_SEG.sub('', base)
+            return COMMON_ALIAS.get(base, base)
+
+    # remove version segments like -8.14.3-
+    name = RE_VERSION_SEG.sub('-', name)
+
+    tokens = re.split(r'[-_.]', name)
+    tokens = [t for t in tokens if t]
+    if not tokens:
+        return original
+
+    # prefer an alphabetic token
+    for t in tokens:
+        tl = t.lower()
+        if tl and not tl.isdigit() and tl not in ('ds',):
+            if any(p.search(tl) for p in RE_DATE_PATTERNS):
+                continue
+            if tl in COMMON_ALIAS:
+                return COMMON_ALIAS[tl]
+            return tl
+
+    # fallback
+    base_lower = tokens[0].lower()
+    base_clean = re.sub(r'[^a-zA-Z0-9]+$', '', base_lower)
+    return COMMON_ALIAS.get(base_clean, base_clean or original)
+
+
+# ---------- @timestamp range extraction ----------
+def parse_es_date(value, now: Optional[datetime] = None, upper: bool = False) -> Optional[datetime]:
+    """
+    Parse an ES date value (date math like now-24h, ISO string, epoch millis).
+    Date math is resolved to the earliest instant it can mean, or the latest
+    with upper=True (month/year lengths, /unit rounding), so pruning on it
+    never drops an index the range reaches.
+    """
+    now = now or datetime.now(timezone.utc)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    if not isinstance(value, str):
+        return None
+    v = value.strip()
+    m = RE_DATE_MATH.match(v)
+    if m:
+        dt = now
+        for sign, amount, unit in RE_DATE_OP.findall(m.group("ops")):
+            shortest, longest = _UNIT_DELTA[unit]
+            if sign == "+":
+                dt += (longest if upper else shortest) * int(amount)
+            else:
+                dt -= (shortest if upper else longest) * int(amount)
+        if m.group("round"):
+            longest = _UNIT_DELTA[m.group("round")][1]
+            dt = dt + longest if upper else dt - longest
+        return dt
+    if v.isdigit():
+        return datetime.fromtimestamp(int(v) / 1000, tz=timezone.utc)
+    try:
+        dt = datetime.fromisoformat(v.split("||")[0].replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def extract_timestamp_range(query_body: dict, field: str = "@timestamp") -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    Find the @timestamp range that every matching document must satisfy.
+
+    Only ranges reachable through the query root or bool.must / bool.filter are
+    used; ranges under should / must_not do not restrict the result set.
+    Returns (start, end) with None for an open bound, or None if no usable range.
+    """
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    found = False
+
+    stack = [query_body]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        if "range" in node and isinstance(node["range"], dict) and field in node["range"]:
+            bounds = node["range"][field]
+            if not isinstance(bounds, dict):
+                continue
+            lo = parse_es_date(bounds.get("gte", bounds.get("gt")))
+            hi = parse_es_date(bounds.get("lte", bounds.get("lt")), upper=True)
+            if lo is None and hi is None:
+                continue
+            found = True
+            # several required ranges intersect
+            if lo is not None:
+                start = lo if start is None else max(start, lo)
+            if hi is not None:
+                end = hi if end is None else min(end, hi)
+        if "bool" in node and isinstance(node["bool"], dict):
+            for key in ("must", "filter"):
+                if key in node["bool"]:
+                    stack.append(node["bool"][key])
+
+    return (start, end) if found else None
+
+
+# ---------- pruning ----------
+def _covered_ranges(entries: List[dict]) -> Dict[str, Tuple[datetime, Optional[datetime]]]:
+    """
+    Time span each dated index may hold.
+
+    Daily indices hold their own day. Data stream backing indices hold
+    everything from their rollover date up to the next generation's date,
+    and the newest one (the write index) is open ended.
+    """
+    spans: Dict[str, Tuple[datetime, Optional[datetime]]] = {}
+    by_series: Dict[str, List[dict]] = {}
+    for e in entries:
+        by_series.setdefault(e["series"], []).append(e)
+    for series_entries in by_series.values():
+        series_entries.sort(key=lambda e: (e["date"], e["index"]))
+        for i, e in enumerate(series_entries):
+            if e["datastream"]:
+                nxt = series_entries[i + 1]["date"] if i + 1 < len(series_entries) else None
+                spans[e["index"]] = (e["date"], nxt)
+            else:
+                spans[e["index"]] = (e["date"], e["date"] + timedelta(days=1))
+    return spans
+
+
+def prune_index_pattern(es_url: str, used_pattern: str, query_body: dict) -> Tuple[str, bool]:
+    """
+    Replace wildcard index patterns with the concrete indices whose date
+    overlaps the query's @timestamp range.
+
+    Conservative by design: any piece that matches an undated index, matches
+    nothing, resolves through a data stream or alias, or would expand to more
+    than ES_PRUNE_MAX_INDICES names is kept as-is. Returns (pattern, pruned).
+    """
+    time_range = extract_timestamp_range(query_body)
+    if time_range is None:
+        return used_pattern, False
+    start, end = time_range
+    start = start - PRUNE_SLACK if start else None
+    end = end + PRUNE_SLACK if end else None
+
+    try:
+        listing = list_indices_with_dates(es_url)
+    except Exception as e:
+        print(f"Warning: index listing failed, skipping index pruning: {e}")
+        return used_pattern, False
+
+    pruned = False
+    out_parts: List[str] = []
+    for piece in used_pattern.split(","):
+        if "*" not in piece:
+            out_parts.append(piece)
+            continue
+        if any(fnmatch.fnmatchcase(t, piece) for t in listing["targets"]):
+            out_parts.append(piece)
+            continue
+        matched = [e for e in listing["indices"] if fnmatch.fnmatchcase(e["index"], piece)]
+        if not matched or any(e["date"] is None for e in matched):
+            out_parts.append(piece)
+            continue
+        spans = _covered_ranges(matched)
+        keep = [
+            e["index"] for e in matched
+            if (end is None or spans[e["index"]][0] <= end)
+            and (start is None or spans[e["index"]][1] is None or spans[e["index"]][1] >= start)
+        ]
+        if not keep or len(keep) > PRUNE_MAX_INDICES or len(",".join(keep)) > PRUNE_MAX_URL_CHARS:
+            out_parts.append(piece)
+            continue
+        if len(keep) < len(matched):
+            pruned = True
+            print(f"  Index pruning: {piece} -> {len(keep)}/{len(matched)} indices")
+            out_parts.extend(sorted(keep))
+        else:
+            out_parts.append(piece)
+
+    return ",".join(out_parts), pruned
@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from BackEnd.es_client import get_es_session
+
+TIMEOUT = 30
+PIT_KEEP_ALIVE = os.getenv("ES_PIT_KEEP_ALIVE", "2m")
+STREAM_PAGE_SIZE = int(os.getenv("ES_STREAM_PAGE_SIZE", "1000"))
+STREAM_MAX_DOCS = int(os.getenv("ES_STREAM_MAX_DOCS", "500000"))
+STREAM_MAX_BYTES = int(os.getenv("ES_STREAM_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# PIT searches get an implicit _shard_doc tiebreaker, so a single sort key is enough
+DEFAULT_SORT = [{"@timestamp": {"order": "asc", "unmapped_type": "date"}}]
+
+
+def open_pit(es_url: str, index_pattern: str, keep_alive: str = PIT_KEEP_ALIVE) -> str:
+    url = f"{es_url.rstrip('/')}/{index_pattern}/_pit"
+    # ignore_unavailable: the target may be a pruned list of concrete indices
+    r = get_es_session().post(url, params={"keep_alive": keep_alive, "ignore_unavailable": "true"},
+                              timeout=TIMEOUT)
+    r.raise_for_status()
+    return r.json()["id"]
+
+
+def close_pit(es_url: str, pit_id: str) -> None:
+    url = f"{es_url.rstrip('/')}/_pit"
+    try:
+        get_es_session().delete(url, json={"id": pit_id}, timeout=TIMEOUT)
+    except Exception as e:
+        print(f"Warning: failed to close PIT: {e}")
+
+
+def stream_search_to_ndjson(es_url: str, index_pattern: str, query_body: dict, filename: str,
+                            sort=None, only_source: bool = False, source_includes=None,
+                            page_size: int = STREAM_PAGE_SIZE, max_docs: int = STREAM_MAX_DOCS,
+                            max_bytes: int = STREAM_MAX_BYTES) -> dict:
+    """
+    Page through every hit of a query with point-in-time + search_after and
+    append each page to an NDJSON file as it arrives.
+
+    Only one page is held in memory at a time. Paging stops when the result
+    set is exhausted or when max_docs / max_bytes is reached.
+
+    Returns a summary dict: {"saved_file", "docs", "bytes", "pages", "truncated"}.
+    """
+    session = get_es_session()
+    search_url = f"{es_url.rstrip('/')}/_search"
+    params = {"filter_path": "pit_id,hits.hits._source,hits.hits.sort"} if only_source else {}
+
+    body = {
+        "query": query_body,
+        "size": min(page_size, max_docs) if max_docs > 0 else page_size,
+        "sort": sort or DEFAULT_SORT,
+        "track_total_hits": False,
+    }
+    if source_includes:
+        body["_source"] = {"includes": source_includes}
+
+    docs = 0
+    written = 0
+    pages = 0
+    truncated = False
+    pit_id: Optional[str] = open_pit(es_url, index_pattern)
+    f = None
+    try:
+        while True:
+            body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+            r = session.post(search_url, params=params, data=json.dumps(body),
+                             headers={"Content-Type": "application/json"}, timeout=TIMEOUT)
+            r.raise_for_status()
+            data = r.json()
+            # the PIT id may change between pages, always continue with the latest one
+            pit_id = data.get("pit_id", pit_id)
+
+            hits = data.get("hits", {}).get("hits", [])
+            if not hits:
+                break
+            pages += 1
+
+            if f is None:
+                os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+                f = open(filename, "w", encoding="utf-8")
+
+            for h in hits:
+                doc = h.get("_source") if only_source else h
+                line = json.dumps(doc, ensure_ascii=False) + "\n"
+                size_b = len(line.encode("utf-8"))
+                if (max_docs > 0 and docs >= max_docs) or (max_bytes > 0 and written + size_b > max_bytes):
+                    truncated = True
+                    break
+                f.write(line)
+                docs += 1
+                written += size_b
+            if truncated:
+                break
+            f.flush()
+            print(f"  page {pages}: {docs} docs / {written} bytes written to {filename}")
+
+            if len(hits) < body["size"]:
+                break
+            body["search_after"] = hits[-1]["sort"]
+    finally:
+        if f is not None:
+            f.close()
+        if pit_id:
+            close_pit(es_url, pit_id)
+
+    return {
+        "saved_file": filename if docs > 0 else None,
+        "docs": docs,
+        "bytes": written,
+        "pages": pages,
+        "truncated": truncated,
+    }
+
+
+def new_stream_filename() -> str:
+    ts = datetime.now().strftime("%Y%m%dT%H%M%S")
+    return f"logs/elk_stream_{ts}.ndjson"
@@ -0,0 +1,255 @@
+import json
+import math
+import os
+import re
+import threading
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from BackEnd.embedding_cache import normalize_text
+
+ELK_FIELDS_TOP_K = int(os.getenv("ELK_FIELDS_TOP_K", "40"))
+ELK_ALWAYS_FIELDS = ("@timestamp", "host.name")
+SPLUNK_FIELDS_TOP_K = int(os.getenv("SPLUNK_FIELDS_TOP_K", "30"))
+SPLUNK_MAX_SOURCES = int(os.getenv("SPLUNK_MAX_SOURCES", "2"))
+SPLUNK_ALWAYS_FIELDS = ("host", "sourcetype")
+
+# fields every Splunk event carries (or REST arguments fieldsummary picked up)
+# that never help build a query
+SPLUNK_NOISE_FIELDS = frozenset((
+    "linecount", "punct", "timestartpos", "timeendpos", "splunk_server", "splunk_server_group",
+    "eventtype", "tag", "tag::eventtype", "index", "source", "EIO", "apiVersion", "allow_no_index",
+    "include_empty_fields", "field_list", "filter_path", "output_mode", "output_time_format",
+    "sort_dir", "sort_key", "segmentation", "truncation_mode", "max_lines", "meta_fields",
+    "min_freq", "offset", "debug", "getNewAlerts",
+))
+SPLUNK_NOISE_PREFIXES = ("date_",)
+SPLUNK_NOISE_SUFFIXES = ("_Xml",)
+
+RE_CAMEL = re.compile(r'([a-z0-9])([A-Z])|([A-Z]+)([A-Z][a-z])')
+RE_NON_ALNUM = re.compile(r'[^0-9a-zÀ-ỹ]+')
+
+# query term -> field tokens it usually shows up as. Keys are matched as
+# whole words against the normalized intent text, so multi-word Vietnamese
+# phrases work too.
+SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "process": ("process", "image", "executable", "exe", "commandline", "command", "parent", "pid"),
+    "tiến trình": ("process", "image", "executable", "commandline", "parent"),
+    "powershell": ("process", "image", "commandline", "script", "scriptblock", "powershell"),
+    "cmd": ("process", "image", "commandline", "command"),
+    "command": ("commandline", "command", "args", "process"),
+    "lệnh": ("commandline", "command", "args", "process"),
+    "login": ("logon", "logontype", "user", "targetusername", "authentication", "outcome", "code"),
+    "logon": ("logon", "logontype", "user", "targetusername", "authentication", "outcome", "code"),
+    "đăng nhập": ("logon", "logontype", "user", "targetusername", "authentication", "outcome", "code"),
+    "failed": ("outcome", "status", "failurereason", "substatus", "code"),
+    "thất bại": ("outcome", "status", "failurereason", "substatus", "code"),
+    "user": ("user", "username", "targetusername", "subjectusername", "account", "accountname"),
+    "người dùng": ("user", "username", "targetusername", "subjectusername", "account"),
+    "tài khoản": ("user", "account", "accountname", "targetusername"),
+    "host": ("host", "hostname", "computer", "computername"),
+    "máy": ("host", "hostname", "computer", "computername"),
+    "ip": ("ip", "address", "sourceip", "destinationip", "src", "dst"),
+    "network": ("source", "destination", "ip", "port", "protocol", "network", "transport"),
+    "mạng": ("source", "destination", "ip", "port", "protocol", "network"),
+    "connection": ("source", "destination", "ip", "port", "protocol", "initiated"),
+    "kết nối": ("source", "destination", "ip", "port", "protocol"),
+    "port": ("port", "sourceport", "destinationport"),
+    "file": ("file", "path", "targetfilename", "filename", "extension"),
+    "tệp": ("file", "path", "targetfilename", "filename"),
+    "hash": ("hash", "hashes", "sha256", "sha1", "md5"),
+    "dns": ("dns", "query", "queryname", "question", "answers"),
+    "registry": ("registry", "targetobject", "details", "key", "value"),
+    "service": ("service", "servicename", "imagepath"),
+    "dịch vụ": ("service", "servicename", "imagepath"),
+    "url": ("url", "domain", "path", "original"),
+    "domain": ("domain", "dns", "queryname", "url"),
+    "event": ("code", "action", "category", "type", "eventid"),
+    "sự kiện": ("code", "action", "category", "type"),
+    "alert": ("alert", "signature", "severity", "rule", "category"),
+    "cảnh báo": ("alert", "signature", "severity", "rule"),
+    "firewall": ("action", "source", "destination", "port", "rule", "interface"),
+    "ssh": ("ssh", "user", "source", "ip", "outcome", "auth"),
+    "sudo": ("sudo", "user", "command", "process"),
+}
+
+# query term -> tokens of Splunk source names that usually hold those events
+SOURCE_HINTS: Dict[str, Tuple[str, ...]] = {
+    "process": ("sysmon",), "tiến trình": ("sysmon",), "powershell": ("sysmon", "powershell"),
+    "cmd": ("sysmon",), "network": ("sysmon", "suricata", "netstat"), "mạng": ("sysmon", "suricata"),
+    "connection": ("sysmon", "suricata", "netstat"), "kết nối": ("sysmon", "suricata", "netstat"),
+    "dns": ("sysmon", "suricata"), "registry": ("sysmon", "winregistry"), "hash": ("sysmon",),
+    "file": ("sysmon",), "tệp": ("sysmon",),
+    "login": ("security", "auth"), "logon": ("security", "auth"), "đăng nhập": ("security", "auth"),
+    "user": ("security",), "service": ("system",), "dịch vụ": ("system",),
+    "ssh": ("auth", "sshd"), "sudo": ("auth",), "firewall": ("ufw", "suricata"),
+    "alert": ("suricata",), "cảnh báo": ("suricata",),
+}
+
+SOURCE_NAME_WEIGHT = 8.0    # about one strong field match
+
+_STOPWORDS = frozenset(("the", "a", "an", "of", "in", "on", "for", "and", "or", "to", "with", "from",
+                        "trong", "của", "và", "các", "những", "là", "có", "qua", "ngày", "giờ"))
+
+
+def field_tokens(field: str) -> List[str]:
+    """Tokens of a dotted field name, split on separators and camelCase, plus joined neighbours."""
+    spaced = RE_CAMEL.sub(lambda m: f"{m.group(1) or m.group(3)} {m.group(2) or m.group(4)}", field)
+    words = [w for w in RE_NON_ALNUM.split(spaced.lower()) if w]
+    joined = [a + b for a, b in zip(words, words[1:])]
+    return words + joined
+
+
+def intent_terms(intent) -> Tuple[Dict[str, float], List[str], str]:
+    """
+    Turn the parsed intent (dict, JSON string or free text) into weighted
+    search terms, the field names it mentions explicitly and its normalized text.
+    """
+    if isinstance(intent, str):
+        try:
+            intent = json.loads(intent)
+        except (ValueError, TypeError):
+            pass
+
+    texts: List[str] = []
+    mentioned: List[str] = []
+    if isinstance(intent, dict):
+        texts.extend(str(k) for k in intent.get("keywords") or [])
+        target = intent.get("target") or {}
+        if isinstance(target, dict):
+            texts.append(str(target.get("type") or ""))
+        for cond in intent.get("conditions") or []:
+            if isinstance(cond, dict) and cond.get("field"):
+                mentioned.append(str(cond["field"]))
+                texts.append(str(cond["field"]))
+        texts.append(str(intent.get("original_query") or ""))
+    else:
+        texts.append(str(intent or ""))
+
+    text = normalize_text(" ".join(texts))
+    terms: Dict[str, float] = {}
+    for word in RE_NON_ALNUM.split(text):
+        if word and word not in _STOPWORDS and len(word) > 1:
+            terms[word] = max(terms.get(word, 0.0), 1.0)
+    padded = f" {text} "
+    for key, expansions in SYNONYMS.items():
+        if f" {key} " in padded:
+            for tok in expansions:
+                terms[tok] = max(terms.get(tok, 0.0), 0.6)
+    return terms, mentioned, text
+
+
+class FieldIndex:
+    """
+    Inverted token index over a list of field names.
+
+    Object parents like "host" (when "host.name" also exists) are left out:
+    they cannot be filtered on. Token weights use IDF, so generic segments
+    such as "winlog" or "event_data" count for little.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        fields = list(dict.fromkeys(fields))
+        parents = {f.rsplit(".", 1)[0] for f in fields if "." in f}
+        self.fields = [f for f in fields if f not in parents]
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for i, field in enumerate(self.fields):
+            leaf_tokens = field_tokens(field.rsplit(".", 1)[-1])
+            leaf = set(leaf_tokens)
+            # a hit on the last segment says more than a hit on a namespace,
+            # and more still when the segment is short ("Image" vs "ParentImage")
+            leaf_words = (len(leaf_tokens) + 1) // 2     # field_tokens adds n-1 joined pairs to n words
+            leaf_boost = 2.0 / math.sqrt(max(1, leaf_words))
+            for tok in set(field_tokens(field)):
+                self.postings.setdefault(tok, []).append((i, leaf_boost if tok in leaf else 1.0))
+        n = max(1, len(self.fields))
+        self.idf = {tok: math.log(1 + n / len(post)) for tok, post in self.postings.items()}
+
+    def rank(self, terms: Dict[str, float]) -> List[Tuple[str, float]]:
+        scores: Dict[int, float] = {}
+        for term, weight in terms.items():
+            for i, boost in self.postings.get(term, ()):
+                scores[i] = scores.get(i, 0.0) + weight * boost * self.idf[term]
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.fields[kv[0]].count("."), self.fields[kv[0]]))
+        return [(self.fields[i], score) for i, score in ranked]
+
+
+_index_cache: Dict[Hashable, Tuple[object, FieldIndex]] = {}
+_index_lock = threading.Lock()
+
+
+def get_field_index(key: Hashable, version, fields: Sequence[str]) -> FieldIndex:
+    """FieldIndex for key, rebuilt only when the schema version changes."""
+    cached = _index_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    index = FieldIndex(fields)
+    with _index_lock:
+        _index_cache[key] = (version, index)
+    return index
+
+
+def _select(index: FieldIndex, terms: Dict[str, float], mentioned: List[str], top_k: int,
+            always: Sequence[str], known: frozenset) -> List[str]:
+    ranked = [f for f, _ in index.rank(terms)]
+    if not ranked:
+        return []
+    selected = [f for f in always if f in known]
+    selected += [f for f in mentioned if f in known]
+    selected += ranked[:max(0, top_k)]
+    return list(dict.fromkeys(selected))
+
+
+def select_fields(index: FieldIndex, intent, top_k: int,
+                  always: Sequence[str] = (), known: Optional[frozenset] = None) -> List[str]:
+    """
+    Always-needed fields first, then fields named in the intent's conditions,
+    then the top_k best-scoring fields. Returns [] when nothing matches so the
+    caller can fall back to the full list.
+    """
+    terms, mentioned, _ = intent_terms(intent)
+    known = known if known is not None else frozenset(index.fields)
+    return _select(index, terms, mentioned, top_k, always, known)
+
+
+def is_splunk_noise(field: str) -> bool:
+    return (field in SPLUNK_NOISE_FIELDS or field.startswith(SPLUNK_NOISE_PREFIXES)
+            or field.endswith(SPLUNK_NOISE_SUFFIXES))
+
+
+def _source_name_score(source: str, terms: Dict[str, float], text: str) -> float:
+    tokens = set(field_tokens(source))
+    score = sum(SOURCE_NAME_WEIGHT * w for t, w in terms.items() if t in tokens)
+    padded = f" {text} "
+    for key, hints in SOURCE_HINTS.items():
+        if f" {key} " in padded and tokens.intersection(hints):
+            score += SOURCE_NAME_WEIGHT
+    return score
+
+
+def select_sources(indexes: Dict[str, FieldIndex], intent, top_k: int, max_sources: int,
+                   always: Sequence[str] = ()) -> Dict[str, dict]:
+    """
+    Pick the max_sources sources that best fit the intent and the top_k
+    fields of each. A source scores on its name (plus SOURCE_HINTS) and on
+    the mean of its five best field scores, so big sources like
+    XmlWinEventLog:Security don't win on field count alone. Returns {} when
+    nothing matches.
+    """
+    terms, mentioned, text = intent_terms(intent)
+    scored = []
+    for source, index in indexes.items():
+        top = [score for _, score in index.rank(terms)[:5]]
+        field_score = sum(top) / 5
+        total = _source_name_score(source, terms, text) + field_score
+        if total > 0:
+            scored.append((total, source))
+    scored.sort(key=lambda x: (-x[0], x[1]))
+
+    out: Dict[str, dict] = {}
+    for _, source in scored[:max(1, max_sources)]:
+        index = indexes[source]
+        known = frozenset(index.fields)
+        fields = (_select(index, terms, mentioned, top_k, always, known)
+                  or list(dict.fromkeys([f for f in always if f in known] + index.fields[:top_k])))
+        out[source] = {"fields": fields}
+    return out
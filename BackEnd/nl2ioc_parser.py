@@ -0,0 +1,225 @@
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from BackEnd.embedding_cache import normalize_text, RE_SPACES
+
+NL2IOC_FASTPATH = os.getenv("NL2IOC_FASTPATH", "true").lower() == "true"
+NL2IOC_FASTPATH_MIN_CONFIDENCE = float(os.getenv("NL2IOC_FASTPATH_MIN_CONFIDENCE", "0.8"))
+DEFAULT_TIME_START = "now-24h"         # same default as the NL2IOC backstory
+
+# ---------- entities ----------
+RE_IPV4 = re.compile(r'\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b')
+RE_IPV6 = re.compile(r'(?<![\w:])(?:[0-9a-f]{1,4}:){2,7}[0-9a-f]{0,4}(?![\w:])', re.IGNORECASE)
+RE_HASH = re.compile(r'\b(?:[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64})\b', re.IGNORECASE)
+# "host X" / "user X" only name an entity when X is written as a value:
+# after ':' or '=', in quotes, or with the shape of a host / account
+RE_HOST = re.compile(r'\b(?:host|hostname|computer|server|machine|máy)\b(?P<sep>\s*[:=]\s*|\s+)'
+                     r'(?P<quote>["\']?)(?P<value>[^\s"\',;]+)', re.IGNORECASE)
+RE_HOST_SHAPE = re.compile(r'[\d.-]')                                                # dc01, web-1, srv.corp
+RE_HOSTNAME = re.compile(r'^(?=.*[a-z])[a-z0-9][a-z0-9.-]*[a-z0-9]$', re.IGNORECASE)
+RE_HOSTLIKE = re.compile(r'\b[a-z][a-z0-9]*-[a-z0-9-]*\d[a-z0-9-]*\b', re.IGNORECASE)   # desktop-7a6b43i
+RE_USER = re.compile(r'\b(?:user|username|account|người dùng|tài khoản)\b(?P<sep>\s*[:=]\s*|\s+)'
+                     r'(?P<quote>["\']?)(?P<value>[^\s"\',;]+)', re.IGNORECASE)
+RE_ACCOUNT_SHAPE = re.compile(r'[\\@]|\$$|^(?:administrator|admin|root|guest|krbtgt|svc[_-]\w+)$',
+                              re.IGNORECASE)                                        # corp\bob, bob@corp, dc01$
+RE_ACCOUNT = re.compile(r'^[a-z0-9_.$\\@-]{2,}$', re.IGNORECASE)
+RE_FILE = re.compile(r'\b[\w-]+\.(?:exe|dll|ps1|bat|cmd|vbs|js|sh|py|msi|scr)\b', re.IGNORECASE)
+RE_EVENT_ID = re.compile(r'\b(?:event\s*(?:id|code)?|eventid|sự kiện|mã sự kiện)\s*[:=#]?\s*(\d{1,5})\b',
+                         re.IGNORECASE)
+RE_PORT = re.compile(r'\b(?:port|cổng)\s*[:=]?\s*(\d{1,5})\b', re.IGNORECASE)
+RE_NUMBER = re.compile(r'\b\d+\b')
+RE_DATE = re.compile(r'\b\d{4}[-/.]\d{1,2}[-/.]\d{1,2}\b|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b')   # absolute dates
+RE_WORD = re.compile(r'[^\W\d_]+', re.UNICODE)
+
+# well known executables, matched without their extension
+PROCESSES = (
+    "powershell", "pwsh", "cmd", "rundll32", "regsvr32", "mshta", "wscript", "cscript", "certutil",
+    "bitsadmin", "wmic", "psexec", "mimikatz", "schtasks", "net", "net1", "whoami", "nltest",
+    "vssadmin", "reg", "msbuild", "lsass", "svchost", "explorer", "winword", "excel", "procdump",
+    "curl", "wget", "bash", "python", "nc", "ncat", "ssh", "sudo",
+)
+RE_PROCESS = re.compile(r'\b(' + "|".join(PROCESSES) + r')\b', re.IGNORECASE)
+
+# ---------- time ----------
+RE_TIME_UNIT = re.compile(
+    r'\b(\d+)\s*(phút|phut|minutes?|mins?|giờ|gio|tiếng|hours?|hrs?|h|ngày|ngay|days?|d|tuần|tuan|weeks?|w'
+    r'|tháng|thang|months?)\b', re.IGNORECASE)
+TIME_UNITS = {
+    "phút": "m", "phut": "m", "minute": "m", "minutes": "m", "min": "m", "mins": "m",
+    "giờ": "h", "gio": "h", "tiếng": "h", "hour": "h", "hours": "h", "hr": "h", "hrs": "h", "h": "h",
+    "ngày": "d", "ngay": "d", "day": "d", "days": "d", "d": "d",
+    "tuần": "w", "tuan": "w", "week": "w", "weeks": "w", "w": "w",
+    "tháng": "M", "thang": "M", "month": "M", "months": "M",
+}
+TIME_WORDS = (                      # checked in order, first match wins
+    (re.compile(r'\b(?:hôm qua|yesterday)\b'), "now-24h"),
+    (re.compile(r'\b(?:hôm nay|today)\b'), "now/d"),
+    (re.compile(r'\b(?:tuần qua|tuần trước|tuần này|last week|past week|this week)\b'), "now-7d"),
+    (re.compile(r'\b(?:tháng qua|tháng trước|last month|past month)\b'), "now-30d"),
+    (re.compile(r'\b(?:giờ qua|last hour|past hour)\b'), "now-1h"),
+)
+
+# ---------- vocabulary ----------
+INTENT_WORDS = (
+    ("investigate", re.compile(r'\b(?:investigate|điều tra|phân tích|truy vết)\b')),
+    ("report", re.compile(r'\b(?:report|báo cáo|thống kê|summary|tổng hợp|top|count|đếm)\b')),
+    ("alert", re.compile(r'\b(?:alert|alerts|cảnh báo)\b')),
+)
+# the parser only builds positive conditions; a question with any of these goes to the LLM
+RE_NEGATION = re.compile(r'\b(?:not|except|excluding|exclude|without|không|ngoại trừ|trừ)\b')
+# phrase -> canonical keyword (the NL2IOC examples use English keywords)
+KEYWORDS = {
+    "đăng nhập": "login", "login": "login", "logins": "login", "logon": "login", "logons": "login", "log in": "login",
+    "thất bại": "failed", "failed": "failed", "failure": "failed", "sai mật khẩu": "failed",
+    "thành công": "success", "successful": "success", "success": "success",
+    "tiến trình": "process", "process": "process", "processes": "process",
+    "kết nối": "connection", "connection": "connection", "connections": "connection",
+    "mạng": "network", "network": "network",
+    "dns": "dns", "http": "http", "rdp": "rdp", "smb": "smb", "ssh": "ssh", "vpn": "vpn",
+    "firewall": "firewall", "tường lửa": "firewall", "suricata": "suricata", "sysmon": "sysmon",
+    "registry": "registry", "service": "service", "dịch vụ": "service", "scheduled task": "scheduled task",
+    "malware": "malware", "mã độc": "malware", "brute force": "brute force", "dò mật khẩu": "brute force",
+    "lateral movement": "lateral movement", "privilege": "privilege", "leo thang": "privilege",
+    "download": "download", "tải xuống": "download", "file": "file", "tệp": "file",
+    "command line": "command line", "dòng lệnh": "command line", "script": "script",
+    "windows": "windows", "linux": "linux", "sudo": "sudo",
+}
+RE_KEYWORDS = re.compile(r'\b(' + "|".join(sorted(map(re.escape, KEYWORDS), key=len, reverse=True)) + r')\b')
+# words that carry no search meaning; anything else left unexplained lowers the confidence
+STOPWORDS = frozenset("""
+tìm tim kiếm hiển thị liệt kê cho xem tôi các những mọi tất cả sự kiện events event logs log nhật ký
+liên quan đến tới về trong trên từ của và hoặc hay với là có được bị đã những nào gì qua trước gần đây này
+find search show list get give me all any the a an of in on at from to for by and or with that which what
+is are was were be been related about during within last past recent recently latest across between
+host hostname computer server machine máy user username account người dùng tài khoản ip địa chỉ address
+source destination nguồn đích port cổng id code mã please hãy giúp vui lòng ngày giờ phút tuần tháng
+days day hours hour minutes minute weeks week months month attempts attempt activity activities
+hoạt động lần times hash hashes md5 sha1 sha256
+""".split())
+
+
+def parse_time_range(text: str) -> Tuple[Optional[str], List[Tuple[int, int]]]:
+    """('now-3d' style start, matched spans) from normalized text; (None, []) when no time is given."""
+    m = RE_TIME_UNIT.search(text)
+    if m:
+        unit = TIME_UNITS[m.group(2).lower()]
+        amount = int(m.group(1))
+        if unit == "w":
+            unit, amount = "d", amount * 7
+        elif unit == "M":
+            unit, amount = "d", amount * 30
+        return f"now-{amount}{unit}", [m.span()]
+    for pattern, start in TIME_WORDS:
+        m = pattern.search(text)
+        if m:
+            return start, [m.span()]
+    return None, []
+
+
+def _values(pattern: re.Pattern, text: str, shape: re.Pattern) -> List[str]:
+    """Values after a host/user word that are written as values (see RE_HOST / RE_USER)."""
+    return [m.group("value") for m in pattern.finditer(text)
+            if m.group("sep").strip() or m.group("quote") or shape.search(m.group("value"))]
+
+
+def extract_entities(question: str) -> Dict[str, List[str]]:
+    """
+    IPs, hosts, users, hashes, processes, event IDs and ports in a question.
+    Hosts and users keep the case they were written in; everything else is
+    read from the normalized text.
+    """
+    original = RE_SPACES.sub(" ", unicodedata.normalize("NFC", question or "")).strip()
+    text = normalize_text(question)
+    ips = list(dict.fromkeys(RE_IPV4.findall(text) + RE_IPV6.findall(text)))
+    hashes = list(dict.fromkeys(RE_HASH.findall(text)))
+    users = [u for u in dict.fromkeys(_values(RE_USER, original, RE_ACCOUNT_SHAPE))
+             if RE_ACCOUNT.match(u) and u.lower() not in STOPWORDS and u.lower() not in KEYWORDS]
+    hosts = [h for h in dict.fromkeys(_values(RE_HOST, original, RE_HOST_SHAPE) + RE_HOSTLIKE.findall(original))
+             if RE_HOSTNAME.match(h) and h not in ips and h.lower() not in STOPWORDS
+             and h.lower() not in KEYWORDS and not RE_FILE.fullmatch(h)]
+    processes = list(dict.fromkeys(RE_FILE.findall(text) + [p for p in RE_PROCESS.findall(text)
+                                                             if f"{p}.exe" not in text]))
+    return {
+        "ips": ips,
+        "hosts": hosts,
+        "users": users,
+        "hashes": hashes,
+        "processes": processes,
+        "event_ids": list(dict.fromkeys(RE_EVENT_ID.findall(text))),
+        "ports": list(dict.fromkeys(RE_PORT.findall(text))),
+    }
+
+
+def strip_matches(text: str, entities: Dict[str, List[str]], spans: List[Tuple[int, int]]) -> str:
+    """text with the time expression spans and entity values blanked out."""
+    rest = list(text)
+    for start, end in spans:
+        rest[start:end] = " " * (end - start)
+    rest = "".join(rest)
+    for values in entities.values():
+        for value in values:
+            rest = rest.replace(value.lower(), " ")
+    return rest
+
+
+def _unexplained_words(text: str, entities: Dict[str, List[str]], spans: List[Tuple[int, int]]) -> List[str]:
+    rest = RE_KEYWORDS.sub(" ", strip_matches(text, entities, spans))
+    return [w for w in RE_WORD.findall(rest) if w not in STOPWORDS and len(w) > 1] + RE_NUMBER.findall(rest)
+
+
+def parse_intent(question: str) -> Tuple[dict, float]:
+    """
+    Rule-based NL2IOC: the intent JSON the NL2IOC agent would produce and a
+    confidence in [0, 1]. The confidence is the share of meaningful words
+    explained by a time expression, an entity or a known keyword (leftover
+    numbers count as unexplained). It is 0 when nothing searchable (target,
+    condition or keyword) was found, and when the question has a negation
+    or an absolute date, which the intent built here cannot express.
+    """
+    text = normalize_text(question)
+    start, spans = parse_time_range(text)
+    entities = extract_entities(question)
+    keywords = list(dict.fromkeys(KEYWORDS[k] for k in RE_KEYWORDS.findall(text)))
+    for process in entities["processes"]:
+        name = process.rsplit(".", 1)[0] if RE_FILE.fullmatch(process) else process
+        if name not in keywords:
+            keywords.append(name)
+
+    intent_type = next((name for name, pattern in INTENT_WORDS if pattern.search(text)), "search")
+
+    candidates = [("ip", entities["ips"]), ("host", entities["hosts"]), ("user", entities["users"]),
+                  ("process", entities["processes"]), ("event", entities["event_ids"])]
+    target_type, target_value = next(((t, v[0]) for t, v in candidates if v), ("event", None))
+
+    conditions = []
+    for field, values in (("ip", entities["ips"]), ("host.name", entities["hosts"]),
+                          ("user.name", entities["users"]), ("process.name", entities["processes"]),
+                          ("event.code", entities["event_ids"]), ("port", entities["ports"]),
+                          ("hash", entities["hashes"])):
+        for value in values:
+            if value == target_value:
+                continue
+            operator = "contains" if field == "process.name" else "eq"
+            conditions.append({"field": field, "operator": operator, "value": value})
+    if "failed" in keywords and "login" in keywords:
+        conditions.append({"field": "event.outcome", "operator": "eq", "value": "failure"})
+
+    intent = {
+        "intent": intent_type,
+        "target": {"type": target_type, "value": target_value},
+        "time_range": {"start": start or DEFAULT_TIME_START, "end": "now"},
+        "conditions": conditions,
+        "keywords": keywords,
+        "original_query": question,
+    }
+
+    if target_value is None and not keywords and not conditions:
+        return intent, 0.0
+    if RE_NEGATION.search(text) or RE_DATE.search(text):
+        return intent, 0.0
+    unexplained = _unexplained_words(text, entities, spans)
+    explained = len(spans) + sum(len(v) for v in entities.values()) + len(RE_KEYWORDS.findall(text))
+    confidence = explained / (explained + len(unexplained)) if explained else 0.0
+    return intent, round(confidence, 3)
@@ -0,0 +1,350 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointIdsList, PointStruct, VectorParams
+
+load_dotenv()
+
+JINA_URL = "https://api.jina.ai/v1/embeddings"
+JINA_MODEL = "jina-embeddings-v4"
+JINA_PASSAGE_TASK = "retrieval.passage"
+VECTOR_SIZE = 2048
+
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "32"))   # chunks per Jina request / upsert
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))       # batches in flight
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))  # conversion processes
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "256"))       # chunks waiting for embedding
+INGEST_MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "./cache")
+DELETE_BATCH_SIZE = 1000
+
+# fixed namespace so the same (source, chunk) always maps to the same point id
+POINT_ID_NAMESPACE = uuid.UUID("6f1d8c0e-4b3a-5e7f-9a21-3c5d7e9f1b42")
+
+_jina_session = None
+
+
+def _get_jina_session() -> requests.Session:
+    global _jina_session
+    if _jina_session is None:
+        retry = Retry(total=5, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["POST"]), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=INGEST_CONCURRENCY, pool_maxsize=INGEST_CONCURRENCY,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        _jina_session = session
+    return _jina_session
+
+
+def embed_passages(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of passages with a single Jina request, preserving input order."""
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': 'Bearer ' + os.getenv("JINA_API_KEY")
+    }
+    data = {
+        "model": JINA_MODEL,
+        "task": JINA_PASSAGE_TASK,
+        "input": texts,
+    }
+    response = _get_jina_session().post(JINA_URL, json=data, headers=headers, timeout=120)
+    embedding_data = response.json()
+    items = embedding_data.get('data') or []
+    if len(items) != len(texts):
+        raise ValueError(f"Failed to get valid embeddings from Jina API: {embedding_data}")
+    items.sort(key=lambda item: item.get('index', 0))
+    return [item['embedding'] for item in items]
+
+
+def ensure_collection(client: QdrantClient, collection_name: str, size: int = VECTOR_SIZE) -> bool:
+    """Create the collection if it is missing. Returns True if it was created."""
+    if client.collection_exists(collection_name):
+        return False
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=size, distance=Distance.COSINE),
+    )
+    return True
+
+
+def _batched(iterable: Iterable, n: int) -> Iterator[list]:
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+def _embed_and_upsert(client: QdrantClient, collection_name: str, batch: List[dict]) -> int:
+    vectors = embed_passages([c["text"] for c in batch])
+    points = [
+        PointStruct(
+            id=c.get("id") or str(uuid.uuid4()),
+            vector=vector,
+            payload={"text": c["text"], "metadata": c["metadata"]},
+        )
+        for c, vector in zip(batch, vectors)
+    ]
+    # wait=False: Qdrant acknowledges once the batch is queued, indexing continues server side
+    client.upsert(collection_name=collection_name, points=points, wait=False)
+    return len(points)
+
+
+def ingest_chunks(client: QdrantClient, collection_name: str, chunks: Iterable,
+                  batch_size: int = EMBED_BATCH_SIZE, concurrency: int = INGEST_CONCURRENCY,
+                  on_file: Optional[Callable[[str, dict], None]] = None) -> int:
+    """
+    Embed and upsert chunks ({"text", "metadata", optional "id"}) in batches.
+
+    `chunks` is consumed lazily and at most `concurrency` batches are in flight,
+    so memory stays flat regardless of corpus size. Returns the number of
+    points upserted.
+
+    `chunks` may also carry (key, manifest entry) markers, one after each
+    file's chunks: the file's last batch is flushed and on_file(key, entry)
+    runs once all of its batches are upserted.
+    """
+    total, pending = 0, set()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def submit(batch: List[dict]) -> None:
+            nonlocal total, pending
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                total += sum(fut.result() for fut in done)
+                print(f"  upserted {total} points")
+            pending.add(pool.submit(_embed_and_upsert, client, collection_name, batch))
+
+        batch = []
+        for item in chunks:
+            if not isinstance(item, tuple):
+                batch.append(item)
+                if len(batch) == batch_size:
+                    submit(batch)
+                    batch = []
+                continue
+            if batch:
+                submit(batch)
+                batch = []
+            total += sum(fut.result() for fut in pending)
+            pending = set()
+            if on_file:
+                on_file(*item)
+        if batch:
+            submit(batch)
+        total += sum(fut.result() for fut in pending)
+    print(f"Upserted {total} points into {collection_name}")
+    return total
+
+
+# ---------- incremental ingestion ----------
+def chunk_point_id(source: str, text: str) -> str:
+    """Deterministic point id from (source file, chunk text)."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}\x1f{digest}"))
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _manifest_path(collection_name: str) -> str:
+    return os.path.join(INGEST_MANIFEST_DIR, f"qdrant_manifest_{collection_name}.json")
+
+
+def load_manifest(collection_name: str) -> Dict[str, dict]:
+    path = _manifest_path(collection_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+
+def save_manifest(collection_name: str, files: Dict[str, dict]) -> None:
+    path = _manifest_path(collection_name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"collection": collection_name, "files": files}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def delete_points(client: QdrantClient, collection_name: str, point_ids: List[str]) -> None:
+    for batch in _batched(point_ids, DELETE_BATCH_SIZE):
+        client.delete(collection_name=collection_name, points_selector=PointIdsList(points=batch), wait=False)
+
+
+# ---------- parallel conversion (process pool) ----------
+_worker_state: dict = {}
+
+
+def _init_convert_worker(input_format: str) -> None:
+    """Build one DocumentConverter + HybridChunker per worker process."""
+    from docling.chunking import HybridChunker
+    from docling.datamodel.base_models import InputFormat
+    from docling.document_converter import DocumentConverter
+
+    _worker_state["converter"] = DocumentConverter(allowed_formats=[InputFormat[input_format]])
+    _worker_state["chunker"] = HybridChunker()
+
+
+def _convert_worker(path: str) -> List[dict]:
+    """Convert and chunk one document inside a worker process."""
+    print(f"Processing {path}")
+    result = _worker_state["converter"].convert(path)
+    return [
+        {"text": chunk.text, "metadata": chunk.meta.export_json_dict()}
+        for chunk in _worker_state["chunker"].chunk(result.document)
+    ]
+
+
+_QUEUE_DONE = object()
+
+
+def _drain(chunk_queue: "queue.Queue") -> Iterator:
+    while True:
+        item = chunk_queue.get()
+        if item is _QUEUE_DONE:
+            return
+        yield item
+
+
+def _consume(client: QdrantClient, collection_name: str, chunk_queue: "queue.Queue", result: dict,
+             on_file: Callable[[str, dict], None]) -> None:
+    """Embed/upsert everything put on the queue; on failure keep draining so producers never block."""
+    items = _drain(chunk_queue)
+    try:
+        result["upserted"] = ingest_chunks(client, collection_name, items, on_file=on_file)
+    except Exception as e:
+        result["error"] = e
+        for _ in items:
+            pass
+
+
+def incremental_ingest(client: QdrantClient, collection_name: str, paths: List[str],
+                       input_format: str = "PDF", full: bool = False,
+                       workers: int = INGEST_WORKERS) -> dict:
+    """
+    Bring a collection in line with `paths` using a local manifest.
+
+    Files whose size/mtime (or, failing that, content hash) match the manifest
+    are skipped without being converted. For new or changed files only chunks
+    with unseen ids are embedded, and chunks that disappeared are deleted.
+    Files no longer in `paths` have all their points deleted. `full=True`
+    re-embeds every file but still uses the manifest to delete stale points.
+
+    Documents are converted and chunked by `workers` processes (docling
+    `input_format`, e.g. "PDF"), at most `workers` files at a time. Their
+    chunks go through a bounded queue to a single embed/upsert consumer, so
+    conversion pauses when embedding falls behind. Each file's manifest
+    entry is saved as soon as its chunks are in Qdrant, so an interrupted
+    run resumes after the last finished file.
+    """
+    created = ensure_collection(client, collection_name)
+    # a freshly created collection holds nothing the manifest describes
+    manifest = {} if created else load_manifest(collection_name)
+    stats = {"skipped": 0, "updated": 0, "removed": 0, "upserted": 0, "deleted": 0}
+
+    # ---- plan: which files need converting ----
+    todo = []
+    for path in paths:
+        key = os.path.relpath(path)
+        st = os.stat(path)
+        entry = manifest.get(key)
+        if not full and entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            stats["skipped"] += 1
+            continue
+        file_hash = _file_sha256(path)
+        if not full and entry and entry["sha256"] == file_hash:
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            stats["skipped"] += 1
+            continue
+        print(f"Queued {key} ({'changed' if entry else 'new'})")
+        todo.append((path, key, st, file_hash))
+
+    def commit_file(key: str, new_entry: dict) -> None:
+        """Runs on the consumer thread once the file's chunks are upserted."""
+        old = manifest.get(key)
+        if old:
+            keep = set(new_entry["point_ids"])
+            stale = [pid for pid in old["point_ids"] if pid not in keep]
+            if stale:
+                delete_points(client, collection_name, stale)
+                stats["deleted"] += len(stale)
+        manifest[key] = new_entry
+        stats["updated"] += 1
+        save_manifest(collection_name, manifest)
+
+    # ---- convert in parallel, embed/upsert from a bounded queue ----
+    if todo:
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+        consumed: dict = {}
+        consumer = threading.Thread(target=_consume,
+                                    args=(client, collection_name, chunk_queue, consumed, commit_file),
+                                    daemon=True)
+        consumer.start()
+
+        workers = max(1, min(workers, len(todo)))
+        jobs = iter(todo)
+        try:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_convert_worker, initargs=(input_format,)) as pool:
+                # at most `workers` files submitted; one more is submitted as each finishes
+                futures = {pool.submit(_convert_worker, job[0]): job for job in islice(jobs, workers)}
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        path, key, st, file_hash = futures.pop(fut)
+                        for job in islice(jobs, 1):
+                            futures[pool.submit(_convert_worker, job[0])] = job
+                        entry = manifest.get(key)
+                        skip_ids = set() if (full or not entry) else set(entry["point_ids"])
+                        new_ids: Dict[str, None] = {}
+                        for chunk in fut.result():
+                            chunk["id"] = chunk_point_id(key, chunk["text"])
+                            if chunk["id"] in new_ids:
+                                continue
+                            new_ids[chunk["id"]] = None
+                            if chunk["id"] not in skip_ids:
+                                chunk_queue.put(chunk)    # blocks while the embedder is behind
+                        chunk_queue.put((key, {
+                            "sha256": file_hash,
+                            "size": st.st_size,
+                            "mtime_ns": st.st_mtime_ns,
+                            "point_ids": list(new_ids),
+                        }))
+        finally:
+            chunk_queue.put(_QUEUE_DONE)
+            consumer.join()
+        if "error" in consumed:
+            raise RuntimeError(f"embedding/upsert stage failed after {stats['updated']} files, "
+                               f"the manifest keeps those: {consumed['error']}")
+        stats["upserted"] = consumed["upserted"]
+
+    current = {os.path.relpath(p) for p in paths}
+    for key in [k for k in manifest if k not in current]:
+        print(f"Removing points of vanished file {key}")
+        delete_points(client, collection_name, manifest[key]["point_ids"])
+        stats["deleted"] += len(manifest[key]["point_ids"])
+        del manifest[key]
+        stats["removed"] += 1
+    save_manifest(collection_name, manifest)
+
+    print(f"Incremental ingest of {collection_name}: {stats}")
+    return stats
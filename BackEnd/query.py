@@ -5,7 +5,16 @@ from crewai.tools import tool
 import logging
 import sys
 from datetime import datetime
-from qdrant_client import QdrantClient
+from BackEnd.schema_catalog import ELK_SCHEMA
+from BackEnd.field_ranker import get_field_index, select_fields, ELK_FIELDS_TOP_K, ELK_ALWAYS_FIELDS
+from BackEnd.es_client import get_es_session
+from BackEnd.embedding_cache import EMBEDDING_CACHE
+from BackEnd.vector_store import get_qdrant_client, compact_points, QDRANT_COLLECTION, SEARCH_PAYLOAD_FIELDS
+from BackEnd.es_indices import prune_index_pattern
+from BackEnd.dsl_validator import validate_query, VALIDATE_QUERIES
+from BackEnd.dsl_rewriter import rewrite_query, search_body_options, REWRITE_QUERIES
+from BackEnd.result_cache import RESULT_CACHE, RESULT_CACHE_ENABLED
+from BackEnd.es_stream import stream_search_to_ndjson, new_stream_filename, STREAM_MAX_DOCS, STREAM_MAX_BYTES
 
 # logging.basicConfig(level=logging.INFO)
 
@@ -13,15 +22,24 @@ load_dotenv()
 ES_URL = os.getenv("ELK_HOST", "http://localhost:9200") 
 TIMEOUT = 30
 
+JINA_MODEL = "jina-embeddings-v4"
+JINA_QUERY_TASK = "retrieval.query"
+
 def get_jina_embedding(text):
+    """Query embedding for text, served from the on-disk cache when seen before."""
+    vector = EMBEDDING_CACHE.get_or_compute(text, JINA_MODEL, JINA_QUERY_TASK, _fetch_jina_embedding)
+    print(f"Embedding cache: {EMBEDDING_CACHE.stats()}")
+    return vector
+
+def _fetch_jina_embedding(text):
     url = 'https://api.jina.ai/v1/embeddings'
     headers = {
         'Content-Type': 'application/json',
         'Authorization': 'Bearer ' + os.getenv("JINA_API_KEY")
     }
     data = {
-        "model": "jina-embeddings-v4",
-        "task": "retrieval.query",
+        "model": JINA_MODEL,
+        "task": JINA_QUERY_TASK,
         "input": text
     }
 
@@ -42,31 +60,66 @@ def Get_index_ELK() -> list:
     Returns:
     - List of index names
     """
-    filepath = "./docs/ELK_schema.json"
-    with open (filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    data_index = list(data.keys())
-    return data_index
+    return ELK_SCHEMA.indexes()
 
 @tool("Get_fields_index_ELK")
-def Get_fields_index_ELK(index_name: str) -> list:
+def Get_fields_index_ELK(index_name: str, intent: str = "", top_k: int = ELK_FIELDS_TOP_K) -> list:
     """
     Docstring for Get_fields_index_ELK
     Get list of fields for a given index from ELK schema JSON file.
     Arguments:
     - index_name: name of the index
+    - intent: parsed query intent (JSON or keywords). When given, only the
+      top_k most relevant fields are returned, plus @timestamp and host.name
+    - top_k: number of ranked fields to return (default ELK_FIELDS_TOP_K)
     Returns:
     - List of field names for the specified index
     """
-    filepath = "./docs/ELK_schema.json"
-    with open (filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    fields_index = data.get(index_name, [])
-    return fields_index
+    fields = ELK_SCHEMA.fields(index_name)
+    if not intent or not fields:
+        return fields
+    index = get_field_index(("elk", index_name), ELK_SCHEMA.version, fields)
+    selected = select_fields(index, intent, top_k, ELK_ALWAYS_FIELDS, ELK_SCHEMA.field_set(index_name))
+    # nothing matched the intent: better a long list than a wrong one
+    return selected or fields
+
+def normalize_index_pattern(index_pattern: str) -> str:
+    """
+    Normalize an agent-supplied index pattern (see Query_Elasticsearch for the rules).
+    """
+    # Normalize index pattern pieces (comma separated handling)
+    def normalize_piece(piece: str) -> str:
+        p = piece.strip()
+        if not p:
+            return p
+        low = p.lower()
+        # if it already contains wildcard anywhere, keep as-is
+        if "*" in p:
+            # special-case: if it's 'filebeat' with wildcard already, still map to .ds-filebeat-*?
+            # follow rule: if contains 'filebeat' anywhere, prefer datastream form
+            if "filebeat" in low:
+                return ".ds-filebeat-*"
+            return p
+        # if piece contains 'filebeat' token -> set datastream pattern
+        if "filebeat" in low:
+            return ".ds-filebeat-*"
+        # if already endswith '-*' (should be covered by '*' check but keep safe)
+        if p.endswith("-*"):
+            return p
+        # otherwise append '-*'
+        return p + "-*"
+
+    # if comma-separated list, normalize each part
+    parts = [part for part in index_pattern.split(",")]
+    normalized_parts = [normalize_piece(part) for part in parts if part.strip() != ""]
+
+    # join back; if only one part, used_pattern is that part (no trailing comma)
+    return ",".join(normalized_parts) if normalized_parts else index_pattern
 
 @tool("Query_Elasticsearch")
 def Query_Elasticsearch(index_pattern: str, query_body: dict, size=30, from_=0, sort=None,
-             only_source=False, source_includes=None) -> dict:
+             only_source=False, source_includes=None, stream=False, max_docs=STREAM_MAX_DOCS,
+             max_bytes=STREAM_MAX_BYTES) -> dict:
     """
     Run an Elasticsearch search query.
 
@@ -77,49 +130,121 @@ def Query_Elasticsearch(index_pattern: str, query_body: dict, size=30, from_=0,
       - If a piece contains 'filebeat' (case-insensitive), replace that piece with '.ds-filebeat-*'.
       - Otherwise, append '-*' to the piece.
 
+    Validation:
+      - Before anything is sent, every field in query_body is checked against the ELK schema of the
+        index pattern. Unknown fields or query types return {"error": "invalid_query", "detail": [...]}
+        with close field-name suggestions; fix the query and call again.
+      - Leading wildcards and the 'message' field are returned as "warnings" but still run.
+
+    Rewriting:
+      - Exact-match clauses move from must to filter, wildcards without '*' become term,
+        'value*' becomes prefix ('*value*' is kept as is), and repeated should-terms on one
+        field become a terms clause.
+      - track_total_hits is capped and _source is limited to the queried fields plus a few context
+        fields (unless source_includes is given). The changes are listed in "rewrites", and "query"
+        is the query actually executed.
+
+    Index pruning:
+      - If the query has an @timestamp range in must/filter, wildcard pieces are narrowed to the
+        concrete daily / data stream backing indices whose date overlaps it (cached _cat/indices).
+      - The returned "index_pattern" stays the normalized wildcard pattern.
+
     Behavior:
       - Do NOT attempt to check index existence on the cluster.
       - If results exist, save the full ES response to logs/elk_log_{YYYYmmddTHHMMSS}.json.
-      - Return a dict {"index_pattern": <used_pattern>, "query_body": <query_body>} (and "saved_file" if saved).
+      - Return a dict {"index_pattern": <used_pattern>, "query_body": <query_body>} (and "saved_file" if saved);
+        "call" holds the arguments this call was made with.
+      - Repeating the same query within a few minutes returns the earlier result and saved_file
+        with "cached": true instead of searching again.
+
+    Streaming mode (stream=True):
+      - Use for large time ranges where `size`/`from_` would hit the result window limit.
+      - Opens a point-in-time and pages with search_after; `size` and `from_` are ignored.
+      - Each page is appended to logs/elk_stream_{YYYYmmddTHHMMSS}.ndjson as it arrives.
+      - Stops after max_docs documents or max_bytes bytes; "truncated" is true if a cap was hit.
     """
+    # the arguments as given, before normalization and rewriting, so the call can be replayed
+    call = {"index_pattern": index_pattern, "query_body": query_body, "size": size, "from_": from_,
+            "sort": sort, "only_source": only_source, "source_includes": source_includes,
+            "stream": stream, "max_docs": max_docs, "max_bytes": max_bytes}
     try:
         print(f"Running Elasticsearch query on index pattern: {index_pattern}")
         print(f"Query body: {json.dumps(query_body)}")
 
-        # Normalize index pattern pieces (comma separated handling)
-        def normalize_piece(piece: str) -> str:
-            p = piece.strip()
-            if not p:
-                return p
-            low = p.lower()
-            # if it already contains wildcard anywhere, keep as-is
-            if "*" in p:
-                # special-case: if it's 'filebeat' with wildcard already, still map to .ds-filebeat-*?
-                # follow rule: if contains 'filebeat' anywhere, prefer datastream form
-                if "filebeat" in low:
-                    return ".ds-filebeat-*"
-                return p
-            # if piece contains 'filebeat' token -> set datastream pattern
-            if "filebeat" in low:
-                return ".ds-filebeat-*"
-            # if already endswith '-*' (should be covered by '*' check but keep safe)
-            if p.endswith("-*"):
-                return p
-            # otherwise append '-*'
-            return p + "-*"
+        used_pattern = normalize_index_pattern(index_pattern)
+        print(f"Normalized index pattern to: {used_pattern}")
 
-        # if comma-separated list, normalize each part
-        parts = [part for part in index_pattern.split(",")]
-        normalized_parts = [normalize_piece(part) for part in parts if part.strip() != ""]
+        warnings = []
+        if VALIDATE_QUERIES:
+            report = validate_query(used_pattern, query_body)
+            warnings = report["warnings"]
+            if not report["valid"]:
+                print(f"❌ Query rejected by local validation: {json.dumps(report['errors'], ensure_ascii=False)}")
+                return {"error": "invalid_query", "detail": report["errors"], "warnings": warnings,
+                        "index_pattern": used_pattern, "query_body": query_body}
+            for w in warnings:
+                print(f"⚠️  {w.get('warning')}: {w.get('field', '')} {w.get('detail')}")
 
-        # join back; if only one part, used_pattern is that part (no trailing comma)
-        used_pattern = ",".join(normalized_parts) if normalized_parts else index_pattern
+        rewrites, body_options = [], {}
+        if REWRITE_QUERIES and isinstance(query_body, dict):
+            query_body, rewrites, referenced = rewrite_query(ES_URL, used_pattern, query_body)
+            if not stream:
+                body_options, option_changes = search_body_options(referenced, size)
+                if source_includes:
+                    body_options.pop("_source", None)
+                    option_changes = [c for c in option_changes if not c.startswith("_source")]
+                rewrites += option_changes
+            for change in rewrites:
+                print(f"🛠️  Rewrite: {change}")
 
-        print(f"Normalized index pattern to: {used_pattern}")
+        # same query within the cache TTL / time bucket: reuse the saved file
+        cache_key = None
+        if RESULT_CACHE_ENABLED:
+            cache_key = RESULT_CACHE.es_key({
+                "index_pattern": used_pattern, "query": query_body, "size": size, "from": from_,
+                "sort": sort, "options": body_options, "only_source": only_source,
+                "source_includes": source_includes, "stream": stream,
+                "max_docs": max_docs if stream else None, "max_bytes": max_bytes if stream else None,
+            })
+            cached = RESULT_CACHE.get(cache_key)
+            if cached is not None:
+                cached["cached"] = True
+                cached["call"] = call
+                print(f"♻️  Result cache hit: {cached.get('saved_file')} ({RESULT_CACHE.stats()})")
+                return json.dumps(cached, ensure_ascii=False)
+
+        # narrow wildcards to the dated indices that overlap the @timestamp range
+        search_target, pruned = prune_index_pattern(ES_URL, used_pattern, query_body)
+
+        if stream:
+            print(f"🔍 Streaming Elasticsearch query (PIT + search_after) on {used_pattern}")
+            summary = stream_search_to_ndjson(
+                ES_URL, search_target, query_body, new_stream_filename(),
+                sort=sort, only_source=only_source, source_includes=source_includes,
+                max_docs=int(max_docs), max_bytes=int(max_bytes),
+            )
+            out = {"index_pattern": used_pattern, "query": query_body, "call": call}
+            if summary["saved_file"]:
+                out["saved_file"] = summary["saved_file"]
+                print(f"💾 Streamed {summary['docs']} docs ({summary['pages']} pages) to: {summary['saved_file']}")
+            else:
+                print("⚠️  No results found - file not saved")
+            out["results_count"] = summary["docs"]
+            out["truncated"] = summary["truncated"]
+            if warnings:
+                out["warnings"] = warnings
+            if rewrites:
+                out["rewrites"] = rewrites
+            if cache_key:
+                RESULT_CACHE.put(cache_key, "elk", out)
+            return json.dumps(out, ensure_ascii=False)
 
         # build request
-        url = f"{ES_URL.rstrip('/')}/{used_pattern}/_search"
+        url = f"{ES_URL.rstrip('/')}/{search_target}/_search"
         params = {}
+        if pruned:
+            # an index may have been deleted since the listing was cached
+            params["ignore_unavailable"] = "true"
         if only_source:
             params["filter_path"] = "hits.hits._source"
 
@@ -128,6 +253,7 @@ def Query_Elasticsearch(index_pattern: str, query_body: dict, size=30, from_=0,
             "size": size,
             "from": from_
         }
+        body.update(body_options)
         if sort:
             body["sort"] = sort
         if source_includes:
@@ -145,7 +271,7 @@ def Query_Elasticsearch(index_pattern: str, query_body: dict, size=30, from_=0,
         print(json.dumps(query_body, indent=2))
         print("-" * 60)
         
-        resp = requests.post(url, params=params, data=json.dumps(body), headers=headers, timeout=TIMEOUT)
+        resp = get_es_session().post(url, params=params, data=json.dumps(body), headers=headers, timeout=TIMEOUT)
         resp.raise_for_status()
         data = resp.json()
         
@@ -196,12 +322,18 @@ def Query_Elasticsearch(index_pattern: str, query_body: dict, size=30, from_=0,
             except Exception as e:
                 print(f"Warning: failed to save ES response to logs: {e}")
 
-        out = {"index_pattern": used_pattern, "query": query_body}
+        out = {"index_pattern": used_pattern, "query": query_body, "call": call}
         if saved_file:
             out["saved_file"] = saved_file
             print(f"💾 Results saved to: {saved_file}")
         else:
             print("⚠️  No results found - file not saved")
+        if warnings:
+            out["warnings"] = warnings
+        if rewrites:
+            out["rewrites"] = rewrites
+        if cache_key:
+            RESULT_CACHE.put(cache_key, "elk", out)
         print("=" * 60)
         print(f"📤 Output: {json.dumps(out, ensure_ascii=False)}")
         print("=" * 60)
@@ -224,25 +356,20 @@ def QdrantSearch_ELK(query_text: str, top_k: int = 3) -> dict:
     - top_k: The number of top results to return.
 
     Returns:
-    - A dictionary containing the search results from Qdrant.
+    - JSON list of matches: [{"score", "text", "headings", "source"}], best first.
     """
-    COLLECTION_NAME = "ELK-doc-v1"
-    qdrant_url = "http://192.168.111.162:6333"  # Replace with your Qdrant URL
-    # qdrant_api_key = os.getenv("QDRANT_API_KEY")
-    client = QdrantClient(url=qdrant_url)
+    client = get_qdrant_client()
     q = get_jina_embedding(query_text)
     try:
         results = client.query_points(
-            collection_name=COLLECTION_NAME,
+            collection_name=QDRANT_COLLECTION,
             query=q,
             limit=top_k,
-            score_threshold=0.35
+            score_threshold=0.35,
+            with_vectors=False,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
         )
-        return results
-    except TypeError:
-        # fallback signature difference
-        results = client.query_points(collection_name=COLLECTION_NAME, query=q, limit=top_k)
-        return results
+        return json.dumps(compact_points(results.points), ensure_ascii=False)
     except Exception as e:
         print(f"[ERROR] Error during Qdrant search: {e}.")
         return {"error": "qdrant_search_error", "detail": str(e)}
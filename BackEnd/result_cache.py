@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "./cache/results.sqlite3")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "900"))                  # seconds
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+# queries relative to "now" are only reused inside the same bucket of this many seconds
+RESULT_CACHE_BUCKET = int(os.getenv("RESULT_CACHE_BUCKET", "300"))
+
+RE_ES_NOW = re.compile(r'\bnow\b')
+RE_SPL_TOKEN = re.compile(r'(?:"(?:[^"\\]|\\.)*"|[^\s"|])+|\||"')
+RE_SPL_TIME = re.compile(r'\b(earliest|latest)\s*=\s*"?([^\s"|]+)', re.IGNORECASE)
+RE_SPL_ABSOLUTE = re.compile(r'^(?:\d{9,}|\d{1,2}/\d{1,2}/\d{4}(?::\d{1,2}:\d{2}:\d{2})?)$')
+
+
+def canonical_dsl(payload: dict) -> str:
+    """Key-sorted, whitespace-free JSON so equal DSL bodies share a key whatever their key order."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def canonical_spl(search_query: str) -> str:
+    """Collapse whitespace outside quoted strings and around pipes."""
+    return " ".join(RE_SPL_TOKEN.findall(search_query.strip()))
+
+
+def spl_is_relative(search_query: str) -> bool:
+    """False only when both earliest= and latest= are absolute (epoch or m/d/Y); latest defaults to now."""
+    times = {k.lower(): v for k, v in RE_SPL_TIME.findall(search_query)}
+    earliest, latest = times.get("earliest"), times.get("latest")
+    if earliest is None or latest is None:
+        return True
+    return not ((earliest == "0" or RE_SPL_ABSOLUTE.match(earliest)) and RE_SPL_ABSOLUTE.match(latest))
+
+
+class ResultCache:
+    """
+    Persistent cache of search tool outputs backed by SQLite, with a TTL and
+    LRU eviction, laid out like the embedding cache.
+
+    The key is sha256(kind, canonical query, time bucket). Queries relative
+    to now ("now-24h", earliest=-24h) get the current RESULT_CACHE_BUCKET
+    bucket in their key, so a rerun a few minutes later reuses the result
+    but a rerun after the bucket rolls over searches again. A hit is only
+    served while the saved_file it points to still exists.
+    """
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, ttl: int = RESULT_CACHE_TTL,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES, bucket: int = RESULT_CACHE_BUCKET):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bucket = bucket
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, kind TEXT, output TEXT, created REAL, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used)")
+            self._count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def make_key(self, kind: str, canonical: str, relative: bool) -> str:
+        bucket = str(int(time.time() // self.bucket)) if relative and self.bucket > 0 else "abs"
+        return hashlib.sha256(f"{kind}\x1f{canonical}\x1f{bucket}".encode("utf-8")).hexdigest()
+
+    def es_key(self, payload: dict) -> str:
+        canonical = canonical_dsl(payload)
+        return self.make_key("elk", canonical, bool(RE_ES_NOW.search(canonical)))
+
+    def spl_key(self, search_query: str, max_results: int) -> str:
+        canonical = f"{canonical_spl(search_query)}\x1f{max_results}"
+        return self.make_key("splunk", canonical, spl_is_relative(search_query))
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT output, created FROM results WHERE key = ?", (key,)).fetchone()
+            out = json.loads(row[0]) if row else None
+            saved_file = (out or {}).get("saved_file")
+            if row is None or time.time() - row[1] > self.ttl or (saved_file and not os.path.exists(saved_file)):
+                if row is not None:
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    conn.commit()
+                    self._count -= 1
+                self.misses += 1
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+        return out
+
+    def put(self, key: str, kind: str, output: dict) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, kind, output, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(output, ensure_ascii=False), now, now),
+            )
+            conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+            self._count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            excess = self._count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+            conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self._count,
+        }
+
+
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+ELK_SCHEMA_PATH = os.getenv("ELK_SCHEMA_PATH", "./docs/ELK_schema.json")
+SPLUNK_SCHEMA_PATH = os.getenv("SPLUNK_SCHEMA_PATH", "./docs/splunk_schema.json")
+
+
+def atomic_write_json(path: str, data) -> None:
+    """
+    Write JSON to a temp file in the same directory and os.replace() it over
+    path, so readers see either the old file or the new one, never a partial one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SchemaCatalog:
+    """
+    In-memory view of a schema JSON file.
+
+    The file is parsed once and kept in memory together with the (mtime, size)
+    it was read at. Every access does a cheap os.stat(); the file is only
+    re-read when it has been rewritten, so the schema builders can refresh the
+    file without restarting the agents.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        # (version, state) swapped as one tuple so readers never see a mixed pair
+        self._cached: Optional[Tuple[Optional[Tuple[int, int]], dict]] = None
+
+    def _stat_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.filepath)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _build(self, data: dict) -> dict:
+        """Precompute lookup structures from the raw JSON document."""
+        return {"raw": data}
+
+    def _load(self) -> dict:
+        version = self._stat_version()
+        cached = self._cached
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with self._lock:
+            # another thread may have reloaded while we were waiting
+            cached = self._cached
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            if version is None:
+                print(f"Warning: schema file not found: {self.filepath}")
+                state = self._build({})
+            else:
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                state = self._build(data)
+            self._cached = (version, state)
+            return state
+
+    @property
+    def version(self) -> Optional[Tuple[int, int]]:
+        self._load()
+        return self._cached[0]
+
+
+class ELKSchemaCatalog(SchemaCatalog):
+    """Schema catalog for docs/ELK_schema.json ({index_group: [field, ...]})."""
+
+    def _build(self, data: dict) -> dict:
+        fields = {name: tuple(values or []) for name, values in data.items()}
+        return {
+            "raw": data,
+            "indexes": tuple(fields.keys()),
+            "fields": fields,
+            "field_sets": {name: frozenset(values) for name, values in fields.items()},
+        }
+
+    def indexes(self) -> List[str]:
+        return list(self._load()["indexes"])
+
+    def fields(self, index_name: str) -> List[str]:
+        return list(self._load()["fields"].get(index_name, ()))
+
+    def field_set(self, index_name: str) -> frozenset:
+        return self._load()["field_sets"].get(index_name, frozenset())
+
+    def has_index(self, index_name: str) -> bool:
+        return index_name in self._load()["fields"]
+
+
+class SplunkSchemaCatalog(SchemaCatalog):
+    """Schema catalog for docs/splunk_schema.json ({"indexes": {index: {"source": {source: {"fields": [...]}}}}})."""
+
+    def _build(self, data: dict) -> dict:
+        indexes = data.get("indexes", {}) or {}
+        sources: Dict[str, Tuple[str, ...]] = {}
+        fields: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        for index_name, idx_obj in indexes.items():
+            src_map = (idx_obj or {}).get("source", {}) or {}
+            sources[index_name] = tuple(src_map.keys())
+            for source, src_obj in src_map.items():
+                fields[(index_name, source)] = tuple((src_obj or {}).get("fields", []))
+        return {
+            "raw": data,
+            "indexes": tuple(indexes.keys()),
+            "sources": sources,
+            "fields": fields,
+            "field_sets": {key: frozenset(values) for key, values in fields.items()},
+        }
+
+    def indexes(self) -> List[str]:
+        return list(self._load()["indexes"])
+
+    def sources(self, index_name: str) -> List[str]:
+        return list(self._load()["sources"].get(index_name, ()))
+
+    def fields(self, index_name: str, source: str) -> List[str]:
+        return list(self._load()["fields"].get((index_name, source), ()))
+
+    def field_set(self, index_name: str, source: str) -> frozenset:
+        return self._load()["field_sets"].get((index_name, source), frozenset())
+
+    def has_index(self, index_name: str) -> bool:
+        return index_name in self._load()["sources"]
+
+    def index_sources(self, index_name: str) -> Dict[str, dict]:
+        """Return {source: {"fields": [...]}} for an index, same shape as the schema file."""
+        state = self._load()
+        return {
+            source: {"fields": list(state["fields"][(index_name, source)])}
+            for source in state["sources"].get(index_name, ())
+        }
+
+
+ELK_SCHEMA = ELKSchemaCatalog(ELK_SCHEMA_PATH)
+SPLUNK_SCHEMA = SplunkSchemaCatalog(SPLUNK_SCHEMA_PATH)
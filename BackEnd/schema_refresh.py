@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from BackEnd import ELK_build_schema as elk_builder
+from BackEnd import splunk_schema as splunk_builder
+from BackEnd.schema_catalog import ELK_SCHEMA_PATH, SPLUNK_SCHEMA_PATH, atomic_write_json
+
+load_dotenv()
+
+STATE_PATH = os.getenv("SCHEMA_REFRESH_STATE_PATH", "./cache/schema_refresh_state.json")
+DIFF_DIR = os.getenv("SCHEMA_DIFF_DIR", "./docs/schema_diffs")
+COUNT_DELTA = float(os.getenv("SCHEMA_REFRESH_COUNT_DELTA", "0.1"))   # relative doc count change that triggers a re-probe
+REFRESH_INTERVAL = int(os.getenv("SCHEMA_REFRESH_INTERVAL", "900"))   # seconds between runs, 0 = run once
+SPLUNK_TIME_RANGE = os.getenv("SCHEMA_REFRESH_SPLUNK_RANGE", "-12d")
+
+
+# ---------- persistence ----------
+def _load_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Ignoring unreadable {path}: {e}")
+        return default
+
+
+def load_state() -> dict:
+    return _load_json(STATE_PATH, {})
+
+
+def save_state(state: dict) -> None:
+    atomic_write_json(STATE_PATH, state)
+
+
+def count_changed(old: int, new: int, delta: float = COUNT_DELTA) -> bool:
+    """True if a doc/event count moved by more than `delta` (relative) since last run."""
+    if old == new:
+        return False
+    if not old:
+        return True
+    return abs(new - old) / old > delta
+
+
+def diff_field_maps(old: Dict[str, List[str]], new: Dict[str, List[str]]) -> dict:
+    """Added/removed keys plus per-key added/removed fields between two {key: [fields]} maps."""
+    changed = {}
+    for key in sorted(set(old) & set(new)):
+        before, after = set(old[key]), set(new[key])
+        if before != after:
+            changed[key] = {"added": sorted(after - before), "removed": sorted(before - after)}
+    return {
+        "added": sorted(set(new) - set(old)),
+        "removed": sorted(set(old) - set(new)),
+        "changed": changed,
+    }
+
+
+def write_diff(target: str, diff: dict, probed: List[str]) -> Optional[str]:
+    """Save a diff under docs/schema_diffs/ if anything changed. Returns the file path."""
+    if not (diff["added"] or diff["removed"] or diff["changed"]):
+        return None
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(DIFF_DIR, f"{target}_{ts}.json")
+    atomic_write_json(path, {
+        "target": target,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "probed": probed,
+        **diff,
+    })
+    return path
+
+
+# ---------- ELK ----------
+def get_index_stats(es_url: str) -> Dict[str, Tuple[int, Optional[int]]]:
+    """{index: (docs.count, mapping_version)} for every index in the cluster."""
+    arr = elk_builder.es_request(
+        "GET", f"{es_url.rstrip('/')}/_cat/indices?h=index,docs.count&format=json"
+    ).json()
+    docs = {item["index"]: int(item.get("docs.count") or 0) for item in arr if "index" in item}
+
+    versions: Dict[str, int] = {}
+    try:
+        meta = elk_builder.es_request(
+            "GET", f"{es_url.rstrip('/')}/_cluster/state/metadata",
+            params={"filter_path": "metadata.indices.*.mapping_version"},
+        ).json()
+        for idx, body in meta.get("metadata", {}).get("indices", {}).items():
+            versions[idx] = body.get("mapping_version")
+    except Exception as e:
+        # no cluster:monitor privilege: fall back to doc counts and index sets only
+        print(f"  Could not read mapping versions, comparing doc counts only: {e}")
+
+    return {idx: (count, versions.get(idx)) for idx, count in docs.items()}
+
+
+def _elk_group_dirty(old: Optional[dict], new: dict) -> bool:
+    if old is None or set(old) != set(new):
+        return True
+    if any(old[idx][1] != new[idx][1] for idx in new):
+        return True
+    return count_changed(sum(v[0] for v in old.values()), sum(v[0] for v in new.values()))
+
+
+def refresh_elk(es_url: str = elk_builder.ES_URL, schema_path: str = ELK_SCHEMA_PATH,
+                workers: int = elk_builder.WORKERS) -> dict:
+    """
+    Re-probe only the index groups that are new, gained/lost indices, had a
+    mapping update or whose doc count moved by more than COUNT_DELTA, then
+    write a diff and swap the schema file in atomically.
+    """
+    state = load_state()
+    old_groups = state.get("elk", {})
+    old_schema = _load_json(schema_path, {})
+
+    stats = get_index_stats(es_url)
+    groups: Dict[str, Dict[str, list]] = {}
+    for idx, (count, version) in stats.items():
+        groups.setdefault(elk_builder.normalize_index_name(idx), {})[idx] = [count, version]
+
+    dirty = sorted(name for name, sig in groups.items()
+                   if name not in old_schema or _elk_group_dirty(old_groups.get(name), sig))
+    print(f"ELK: {len(groups)} groups, {len(dirty)} to re-probe: {dirty}")
+
+    # a long-running refresher must not reuse mappings from the previous cycle
+    elk_builder.clear_mapping_cache()
+    new_schema = {name: old_schema[name] for name in groups if name in old_schema}
+    new_state = {name: old_groups[name] for name in groups if name in old_groups}
+
+    def probe(name):
+        return elk_builder.process_group(es_url, name, list(groups[name]))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="refresh") as pool:
+        futures = {name: pool.submit(probe, name) for name in dirty}
+        for name, fut in futures.items():
+            try:
+                new_schema[name] = fut.result()
+                new_state[name] = groups[name]
+            except Exception as e:
+                # keep the previous fields and leave the state stale so the next run retries
+                print(f"  ⚠️ Refresh failed for group {name}: {e}")
+
+    new_schema = {name: new_schema[name] for name in sorted(new_schema)}
+    diff = diff_field_maps(old_schema, new_schema)
+    diff_path = write_diff("elk", diff, dirty)
+    if diff_path:
+        atomic_write_json(schema_path, new_schema)
+        print(f"✅ ELK schema updated ({schema_path}), diff saved to {diff_path}")
+    else:
+        print("ELK schema unchanged")
+
+    state["elk"] = new_state
+    save_state(state)
+    return diff
+
+
+# ---------- Splunk ----------
+def _flatten_splunk(schema: dict) -> Dict[str, List[str]]:
+    out = {}
+    for index, idx_obj in (schema.get("indexes") or {}).items():
+        for source, src_obj in (idx_obj.get("source") or {}).items():
+            out[f"{index}/{source}"] = src_obj.get("fields", [])
+    return out
+
+
+def refresh_splunk(time_range: str = SPLUNK_TIME_RANGE, schema_path: str = SPLUNK_SCHEMA_PATH) -> dict:
+    """
+    Re-run fieldsummary only for index/source pairs that are new or whose
+    event count moved by more than COUNT_DELTA. Splunk has no mapping
+    version, so the tstats counts are the only change signal.
+    """
+    state = load_state()
+    old_counts = state.get("splunk", {})
+    old_schema = _load_json(schema_path, {"indexes": {}})
+    old_indexes = old_schema.get("indexes", {}) or {}
+
+    index_data = splunk_builder.get_indexes_and_sources(time_range)
+    counts: Dict[Tuple[str, str], int] = {}
+    for index, sources in index_data.get("sources", {}).items():
+        for src_obj in sources:
+            counts[(index, src_obj["source"])] = int(src_obj.get("count") or 0)
+
+    def known(index, source):
+        return source in (old_indexes.get(index, {}).get("source") or {})
+
+    dirty = [pair for pair, count in counts.items()
+             if not known(*pair) or count_changed(old_counts.get(f"{pair[0]}/{pair[1]}", 0), count)]
+    print(f"Splunk: {len(counts)} index/source pairs, {len(dirty)} to re-probe")
+
+    fields_by_pair = splunk_builder.collect_fields_async(dirty, time_range) if dirty else {}
+
+    new_indexes: Dict[str, dict] = {}
+    new_counts: Dict[str, int] = {}
+    for (index, source), count in sorted(counts.items()):
+        key = f"{index}/{source}"
+        fields = fields_by_pair.get((index, source))
+        if fields:
+            new_counts[key] = count
+        else:
+            # not probed, or the probe came back empty: keep what we had
+            fields = (old_indexes.get(index, {}).get("source") or {}).get(source, {}).get("fields", [])
+            if key in old_counts:
+                new_counts[key] = old_counts[key]
+        if fields:
+            new_indexes.setdefault(index, {"source": {}})["source"][source] = {"fields": fields}
+
+    new_schema = {"indexes": new_indexes}
+    diff = diff_field_maps(_flatten_splunk(old_schema), _flatten_splunk(new_schema))
+    diff_path = write_diff("splunk", diff, [f"{i}/{s}" for i, s in dirty])
+    if diff_path:
+        atomic_write_json(schema_path, new_schema)
+        print(f"✅ Splunk schema updated ({schema_path}), diff saved to {diff_path}")
+    else:
+        print("Splunk schema unchanged")
+
+    state["splunk"] = new_counts
+    save_state(state)
+    return diff
+
+
+# ---------- daemon ----------
+def refresh_once(target: str = "all") -> None:
+    if target in ("elk", "all"):
+        try:
+            refresh_elk()
+        except Exception as e:
+            print(f"❌ ELK schema refresh failed: {e}")
+    if target in ("splunk", "all"):
+        try:
+            refresh_splunk()
+        except Exception as e:
+            print(f"❌ Splunk schema refresh failed: {e}")
+
+
+if __name__ == "__main__":
+    # run from the repo root: python -m BackEnd.schema_refresh --target all --interval 900
+    parser = argparse.ArgumentParser(description="Incrementally refresh docs/ELK_schema.json and docs/splunk_schema.json")
+    parser.add_argument("--target", choices=["elk", "splunk", "all"], default="all")
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL,
+                        help="seconds between refreshes, 0 = run once and exit")
+    args = parser.parse_args()
+
+    while True:
+        started = time.monotonic()
+        refresh_once(args.target)
+        if args.interval <= 0:
+            break
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
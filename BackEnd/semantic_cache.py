@@ -0,0 +1,178 @@
+import json
+import math
+import operator
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from BackEnd.embedding_cache import normalize_text
+from BackEnd.nl2ioc_parser import extract_entities, parse_time_range, strip_matches, RE_NEGATION, RE_NUMBER
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "./cache/semantic.sqlite3")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))    # cosine similarity
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))      # seconds
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+# most recent entries of the same backend / schema version compared per lookup
+SEMANTIC_CACHE_SCAN_LIMIT = int(os.getenv("SEMANTIC_CACHE_SCAN_LIMIT", "200"))
+
+
+def extract_slots(question: str) -> Dict[str, List[str]]:
+    """
+    Values that change the meaning of a question without changing its
+    embedding much: the time range ("3 ngày qua" and "last 3 days" both give
+    now-3d), the entities nl2ioc_parser finds, any other numbers and the
+    negation words ("from X" vs "not from X").
+    """
+    text = normalize_text(question)
+    start, spans = parse_time_range(text)
+    entities = extract_entities(question)
+    rest = strip_matches(text, entities, spans)
+    slots = {name: sorted(values) for name, values in entities.items()}
+    slots["time"] = [start] if start else []
+    slots["numbers"] = sorted(set(RE_NUMBER.findall(rest)))
+    slots["negations"] = sorted(set(RE_NEGATION.findall(text)))
+    return slots
+
+
+def _unit(vector: List[float]) -> array:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return array("f", (v / norm for v in vector))
+
+
+class SemanticCache:
+    """
+    Local cache of answered questions: (backend, question) -> parsed intent
+    and the final tool call (Query_Elasticsearch / search_splunk arguments).
+
+    Entries live in SQLite; their unit vectors are kept in memory and a
+    lookup is one dot product per entry, over at most SEMANTIC_CACHE_SCAN_LIMIT
+    recent entries of the same backend and schema version. A hit needs cosine
+    similarity >= SEMANTIC_CACHE_THRESHOLD and the same parameter slots
+    (extract_slots) the entry was stored with.
+    """
+
+    def __init__(self, path: str = SEMANTIC_CACHE_PATH, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: int = SEMANTIC_CACHE_TTL, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 scan_limit: int = SEMANTIC_CACHE_SCAN_LIMIT):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.scan_limit = scan_limit
+        self.hits = 0
+        self.misses = 0
+        self.slot_rejects = 0
+        self.lookup_ms = 0.0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows: List[dict] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, backend TEXT, question TEXT, slots TEXT,"
+                " schema_version TEXT, vector BLOB, intent TEXT, call TEXT, created REAL, last_used REAL,"
+                " hits INTEGER DEFAULT 0)"
+            )
+            conn.execute("DELETE FROM questions WHERE created < ?", (time.time() - self.ttl,))
+            conn.commit()
+            self._conn = conn
+            self._rows = [self._row(r) for r in conn.execute(
+                "SELECT id, backend, question, slots, schema_version, vector, intent, call, created FROM questions"
+                " ORDER BY created")]
+        return self._conn
+
+    @staticmethod
+    def _row(r) -> dict:
+        return {"id": r[0], "backend": r[1], "question": r[2], "slots": json.loads(r[3]),
+                "schema_version": r[4], "vector": array("f", r[5]), "intent": r[6],
+                "call": json.loads(r[7]), "created": r[8]}
+
+    def lookup(self, backend: str, question: str, schema_version: str,
+               embed: Callable[[str], List[float]]) -> Optional[dict]:
+        """Best entry for the question as {"question", "intent", "call", "similarity"}, or None."""
+        start = time.perf_counter()
+        vector = _unit(embed(normalize_text(question)))
+        slots = extract_slots(question)
+        now = time.time()
+        best, best_score, slot_rejected = None, self.threshold, False
+        with self._lock:
+            self._connect()
+            # _rows is oldest first; only the newest scan_limit candidates are compared
+            rows = [r for r in self._rows if r["backend"] == backend and r["schema_version"] == schema_version
+                    and now - r["created"] <= self.ttl]
+            for row in rows[-self.scan_limit:]:
+                score = sum(map(operator.mul, vector, row["vector"]))
+                if score < best_score:
+                    continue
+                if row["slots"] != slots:
+                    slot_rejected = True
+                    continue
+                best, best_score = row, score
+            if best is None:
+                self.misses += 1
+                self.slot_rejects += slot_rejected
+            else:
+                self.hits += 1
+                self._conn.execute("UPDATE questions SET last_used = ?, hits = hits + 1 WHERE id = ?",
+                                   (now, best["id"]))
+                self._conn.commit()
+        self.lookup_ms += (time.perf_counter() - start) * 1000
+        if best is None:
+            return None
+        return {"question": best["question"], "intent": best["intent"], "call": best["call"],
+                "similarity": round(best_score, 4)}
+
+    def store(self, backend: str, question: str, schema_version: str, intent: Optional[str], call: dict,
+              embed: Callable[[str], List[float]]) -> None:
+        vector = _unit(embed(normalize_text(question)))
+        slots = json.dumps(extract_slots(question), sort_keys=True)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # a newer answer to the same question replaces the old one
+            conn.execute("DELETE FROM questions WHERE backend = ? AND question = ?", (backend, question))
+            cur = conn.execute(
+                "INSERT INTO questions (backend, question, slots, schema_version, vector, intent, call, created,"
+                " last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (backend, question, slots, schema_version, vector.tobytes(), intent,
+                 json.dumps(call, ensure_ascii=False), now, now),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM questions WHERE id IN "
+                    "(SELECT id FROM questions ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+            conn.commit()
+            self._rows = [r for r in self._rows if not (r["backend"] == backend and r["question"] == question)]
+            self._rows.append({"id": cur.lastrowid, "backend": backend, "question": question,
+                               "slots": json.loads(slots), "schema_version": schema_version, "vector": vector,
+                               "intent": intent, "call": call, "created": now})
+            if excess > 0:
+                alive = {r[0] for r in conn.execute("SELECT id FROM questions")}
+                self._rows = [r for r in self._rows if r["id"] in alive]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "slot_rejects": self.slot_rejects,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "avg_lookup_ms": round(self.lookup_ms / total, 1) if total else 0.0,
+            "entries": len(self._rows),
+        }
+
+
+SEMANTIC_CACHE = SemanticCache()
@@ -0,0 +1,241 @@
+import os
+import re
+from typing import List, Tuple
+
+from BackEnd.spl_validator import mask_quoted, split_pipeline, RE_IDENT
+
+OPTIMIZE_SPL = os.getenv("SPLUNK_OPTIMIZE_QUERIES", "true").lower() == "true"
+# fields stored in the tsidx files; tstats can only filter and group on these
+INDEXED_FIELDS = frozenset(
+    ["index", "source", "sourcetype", "host", "splunk_server"]
+    + [f.strip() for f in os.getenv("SPLUNK_INDEXED_FIELDS", "").split(",") if f.strip()]
+)
+
+RE_IPV4 = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}$')
+RE_MAJOR_BREAKER = re.compile(r'[\s\[\](){}<>|!;,\'"&?+]')
+RE_MINOR_BREAKER = re.compile(r'[/:=@.\-$#%\\_]')
+RE_KV = re.compile(r'^(?P<field>[A-Za-z_][\w.]*)(?P<op>=|!=)(?P<value>"[^"]*"|\S+)$')
+RE_STATS_COUNT = re.compile(r'^stats\s+count(?:\s+as\s+(?P<name>[A-Za-z_]\w*))?'
+                            r'(?:\s+by\s+(?P<by>[A-Za-z_][\w.]*(?:\s*,?\s*[A-Za-z_][\w.]*)*))?\s*$', re.IGNORECASE)
+# one argument of stats/chart/timechart/top/rare; anything else (quotes,
+# eval(), wildcards) fails to match and makes _stats_fields give up
+RE_STATS_TOKEN = re.compile(r'''\s*(?:
+    (?P<agg>[A-Za-z_]\w*\(\s*(?P<arg>[A-Za-z_][\w.]*)?\s*\))
+  | (?P<alias>as\s+[A-Za-z_][\w.]*)
+  | (?P<opt>[A-Za-z_]\w*=[^\s,"*]+)
+  | (?P<word>[A-Za-z_][\w.]*)
+  | ,
+)\s*''', re.IGNORECASE | re.VERBOSE)
+RE_PREFIX_TERM = re.compile(r'^"?(?P<value>[^\s"*?=()]+)\*"?$')
+
+TRANSFORMING = {"stats", "chart", "timechart", "top", "rare"}
+
+
+def _base_tokens(base: str) -> List[str]:
+    """Split a base search on whitespace outside quotes and parentheses."""
+    tokens, start, depth = [], None, 0
+    in_quote = escaped = False
+    for i, ch in enumerate(base + " "):
+        if in_quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_quote = False
+            continue
+        if ch == '"':
+            in_quote = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch.isspace() and depth == 0:
+            if start is not None:
+                tokens.append(base[start:i])
+                start = None
+        elif start is None:
+            start = i
+    return tokens
+
+
+def _complete_value(value: str) -> bool:
+    """A value that names a whole thing (file name, IP, account, path), not a fragment."""
+    return bool(RE_IPV4.match(value) or value.isdigit() or RE_MINOR_BREAKER.search(value))
+
+
+def optimize_raw_terms(tokens: List[str], term_safe: bool) -> Tuple[List[str], List[str]]:
+    """
+    Turn raw "*value*" terms into lexicon lookups. IPs and numbers become
+    TERM(value) when the source is known to put field values between major
+    breakers (term_safe, e.g. Sysmon <Data>10.0.0.5</Data>). A value that
+    starts and ends with a minor breaker ("*/tmp/*") becomes the literal:
+    the breakers already separate it from whatever surrounds it, so the
+    wildcards add nothing. Anything else keeps its wildcards, since the
+    literal would miss e.g. xpowershell.exe.
+    """
+    out, changes = [], []
+    for tok in tokens:
+        if len(tok) > 4 and tok.startswith('"*') and tok.endswith('*"'):
+            value = tok[2:-2]
+            if value and "*" not in value and "?" not in value and _complete_value(value):
+                new = None
+                if term_safe and (RE_IPV4.match(value) or value.isdigit()):
+                    new = f"TERM({value})"
+                elif RE_MINOR_BREAKER.match(value[0]) and RE_MINOR_BREAKER.match(value[-1]) \
+                        and "\\" not in value:
+                    new = f'"{value}"' if RE_MAJOR_BREAKER.search(value) or "=" in value else value
+                if new:
+                    out.append(new)
+                    changes.append(f"{tok} -> {new}")
+                    continue
+        out.append(tok)
+    return out, changes
+
+
+def push_search_filters(segments: List[str]) -> Tuple[List[str], List[str]]:
+    """Merge '| search ...' commands that directly follow the base search into it."""
+    changes = []
+    while len(segments) > 1 and segments[1].lower().startswith("search "):
+        terms = segments[1][len("search "):].strip()
+        if " OR " in f" {terms} " or terms.upper().startswith("NOT "):
+            # keep boolean structure out of the base search's implicit AND
+            terms = f"({terms})"
+        segments = [f"{segments[0]} {terms}"] + segments[2:]
+        changes.append(f"moved '| search {terms}' into the base search")
+    return segments, changes
+
+
+def _stats_fields(segment: str) -> List[str]:
+    """
+    Fields a transforming command reads, or [] if the command can't be
+    parsed completely: quoted names, eval(), wildcards, chart ... over and
+    where clauses all bail out, since dropping a field they need would
+    change the result.
+    """
+    cmd, _, rest = segment.strip().partition(" ")
+    cmd = cmd.lower()
+    fields: List[str] = []
+    after_by = cmd in ("top", "rare")       # top/rare list their fields up front
+    pos = 0
+    while pos < len(rest):
+        m = RE_STATS_TOKEN.match(rest, pos)
+        if not m or m.end() == pos:
+            return []
+        pos = m.end()
+        if m.group("agg"):
+            if after_by:
+                return []
+            if m.group("arg"):
+                fields.append(m.group("arg"))
+        elif m.group("alias"):
+            if after_by:
+                return []
+        elif m.group("word"):
+            word = m.group("word").lower()
+            if word in ("over", "where"):
+                return []
+            if word == "by":
+                after_by = True
+            elif word in ("count", "c") and not after_by:
+                continue
+            elif after_by:
+                fields.append(m.group("word"))
+            else:
+                return []
+    if cmd == "timechart":
+        fields.append("_time")
+    return list(dict.fromkeys(fields))
+
+
+def insert_fields(segments: List[str]) -> Tuple[List[str], List[str]]:
+    """Put '| fields' before the first transforming command so only the fields it reads are extracted."""
+    if len(segments) < 2:
+        return segments, []
+    cmd = segments[1].split(None, 1)[0].lower()
+    if cmd not in TRANSFORMING:
+        return segments, []
+    fields = _stats_fields(segments[1])
+    if not fields:
+        return segments, []
+    cmd_fields = f"fields {', '.join(fields)}"
+    return [segments[0], cmd_fields] + segments[1:], [f"inserted '| {cmd_fields}' before {cmd}"]
+
+
+def to_tstats(tokens: List[str], segments: List[str], term_safe: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    '<indexed filters> | stats count [as x] [by indexed fields]' ->
+    '| tstats count [as x] where <filters> [by fields]'. Only when every base
+    search term is an indexed field, a time modifier or TERM()/PREFIX().
+    On term_safe sources a raw 'value*' term becomes PREFIX(value), the
+    tstats form of a prefix lookup in the lexicon (PREFIX() is not valid in
+    a plain search, so it is only emitted here).
+    """
+    if len(segments) < 2:
+        return segments, []
+    m = RE_STATS_COUNT.match(segments[1])
+    if not m:
+        return segments, []
+    by = [f for f in RE_IDENT.findall(m.group("by") or "")]
+    if any(f not in INDEXED_FIELDS for f in by):
+        return segments, []
+    where_tokens, changes = [], []
+    for tok in tokens:
+        kv = RE_KV.match(tok)
+        if kv and (kv.group("field") in INDEXED_FIELDS or kv.group("field").lower() in ("earliest", "latest")):
+            where_tokens.append(tok)
+            continue
+        if tok.upper().startswith(("TERM(", "PREFIX(")) and tok.endswith(")"):
+            where_tokens.append(tok)
+            continue
+        prefix = RE_PREFIX_TERM.match(tok)
+        if term_safe and prefix and not RE_MAJOR_BREAKER.search(prefix.group("value")):
+            where_tokens.append(f"PREFIX({prefix.group('value')})")
+            changes.append(f"{tok} -> {where_tokens[-1]}")
+            continue
+        return segments, []
+    head = "tstats count" + (f" as {m.group('name')}" if m.group("name") else "")
+    where = " ".join(where_tokens)
+    new = f"{head} where {where}" + (f" by {', '.join(by)}" if by else "")
+    return ["", new] + segments[2:], changes + [f"stats count over indexed fields -> '| {new}'"]
+
+
+def optimize_spl(search_query: str, term_safe: bool = False) -> Tuple[str, List[str]]:
+    """
+    Rewrite an SPL query to cost less on the indexers and search head.
+
+    1. '| search' right after the base search is merged into it
+    2. raw "*value*" terms become TERM(value) / the literal value
+    3. count-only stats over indexed fields become '| tstats', with raw
+       'value*' terms as PREFIX(value) on term_safe sources
+    4. otherwise '| fields' is inserted before the first transforming
+       command, when all of its arguments could be parsed
+
+    Queries that already start with '|' are returned unchanged. Returns
+    (query, list of changes).
+    """
+    query = search_query.strip()
+    if query.startswith("|"):
+        return query, []
+    masked, error = mask_quoted(query)
+    if error:
+        return query, []
+
+    segments = split_pipeline(query, masked)
+    segments, changes = push_search_filters(segments)
+
+    base = segments[0]
+    prefix = ""
+    if base.lower().startswith("search "):
+        prefix, base = "search ", base[len("search "):]
+    tokens, raw_changes = optimize_raw_terms(_base_tokens(base), term_safe)
+    changes += raw_changes
+
+    segments_tstats, tstats_changes = to_tstats(tokens, segments, term_safe)
+    if tstats_changes:
+        return " | ".join(segments_tstats).strip(), changes + tstats_changes
+
+    segments = [prefix + " ".join(tokens)] + segments[1:]
+    segments, fields_changes = insert_fields(segments)
+    changes += fields_changes
+    return " | ".join(segments), changes
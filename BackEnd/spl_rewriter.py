@@ -0,0 +1,153 @@
+import fnmatch
+import os
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+from BackEnd.schema_catalog import SchemaCatalog
+
+SPL_REWRITE_RULES_PATH = os.getenv("SPLUNK_REWRITE_RULES_PATH", "./docs/spl_rewrite_rules.json")
+
+STRATEGIES = ("raw_wildcard", "raw_term", "raw_literal")
+
+# one alternation, tried left to right at every position; every character of
+# the query falls into exactly one token, so joining the tokens gives it back
+RE_TOKEN = re.compile(r'''
+    (?P<quoted>"(?:[^"\\]|\\.)*")
+  | (?P<kv>(?P<field>[A-Za-z_][\w.]*)(?P<op>!=|=)(?P<value>"(?:[^"\\]|\\.)*"|[^\s()\[\]|"]+))
+  | (?P<pipe>\|)
+  | (?P<open>[(\[])
+  | (?P<close>[)\]])
+  | (?P<space>\s+)
+  | (?P<word>[^\s()\[\]|"]+)
+  | (?P<stray>.)
+''', re.VERBOSE)
+RE_TERM_SAFE = re.compile(r'^[^\s\[\](){}<>|!;,\'"&?+=*]+$')
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    return value
+
+
+class SPLRewriteTable(SchemaCatalog):
+    """
+    Per-source raw-text rewrite rules from docs/spl_rewrite_rules.json:
+
+        {"rules": [{"name": ..., "sources": [...], "fields": [...],
+                    "strategy": "raw_wildcard" | "raw_term" | "raw_literal",
+                    "term_safe": bool}]}
+
+    "fields" may also be {field: strategy} to override the rule's strategy
+    per field. Reloaded when the file changes, like the schema catalogs.
+    """
+
+    def _build(self, data: dict) -> dict:
+        rules = []
+        for rule in data.get("rules", []) or []:
+            default = rule.get("strategy", "raw_wildcard")
+            fields = rule.get("fields") or []
+            if not isinstance(fields, dict):
+                fields = {f: default for f in fields}
+            bad = {s for s in fields.values() if s not in STRATEGIES}
+            if bad:
+                print(f"Warning: rewrite rule {rule.get('name')} has unknown strategies {sorted(bad)}, skipped")
+                continue
+            rules.append({
+                "name": rule.get("name", ""),
+                "sources": tuple(s.lower() for s in rule.get("sources", [])),
+                "fields": dict(fields),
+                "term_safe": bool(rule.get("term_safe", False)),
+            })
+        return {
+            "raw": data,
+            "rules": tuple(rules),
+            "all_fields": frozenset(f for r in rules for f in r["fields"]),
+        }
+
+    def rules(self) -> Tuple[dict, ...]:
+        return self._load()["rules"]
+
+    def fields(self) -> FrozenSet[str]:
+        """Every field some rule rewrites; the SPL validator accepts these for any source."""
+        return self._load()["all_fields"]
+
+
+SPL_REWRITES = SPLRewriteTable(SPL_REWRITE_RULES_PATH)
+
+
+def _source_matches(rule_sources: Tuple[str, ...], values: List[str]) -> bool:
+    for value in values:
+        value = value.lower()
+        for src in rule_sources:
+            if fnmatch.fnmatchcase(value, src) or fnmatch.fnmatchcase(src, value):
+                return True
+    return False
+
+
+def _raw_term(value: str, strategy: str) -> str:
+    value = value.strip("*")
+    if strategy == "raw_term" and RE_TERM_SAFE.match(value):
+        return f"TERM({value})"
+    if strategy == "raw_wildcard":
+        return f'"*{value}*"'
+    return f'"{value}"'
+
+
+def rewrite_spl(search_query: str) -> Tuple[str, List[str], bool]:
+    """
+    Rewrite field=value terms of the base search into raw-text terms for the
+    sources listed in the rewrite table, in one pass over the query.
+
+    Only terms before the first pipe and outside subsearches are touched;
+    each one is replaced in place, so OR/NOT/parentheses keep their meaning
+    (field!=value becomes NOT <raw term>). Returns (query, changes,
+    term_safe), term_safe being True when the query's sources matched rules
+    that all say their values sit between major breakers.
+    """
+    tokens = list(RE_TOKEN.finditer(search_query))
+
+    # base search = tokens before the first pipe at bracket depth 0
+    base_end, depth, sources = len(tokens), 0, []
+    for i, m in enumerate(tokens):
+        kind = m.lastgroup
+        if kind == "open" and m.group() == "[":
+            depth += 1
+        elif kind == "close" and m.group() == "]":
+            depth -= 1
+        elif kind == "pipe" and depth == 0 and i > 0:
+            base_end = i
+            break
+        elif kind == "kv" and depth == 0 and m.group("field").lower() == "source" and m.group("op") == "=":
+            sources.append(_unquote(m.group("value")))
+
+    rules = [r for r in SPL_REWRITES.rules() if _source_matches(r["sources"], sources)]
+    if not rules:
+        return search_query, [], False
+    strategies: Dict[str, str] = {}
+    for rule in rules:
+        for field, strategy in rule["fields"].items():
+            strategies.setdefault(field, strategy)
+
+    out, changes, depth = [], [], 0
+    for m in tokens[:base_end]:
+        kind, text = m.lastgroup, m.group()
+        if kind == "open" and text == "[":
+            depth += 1
+        elif kind == "close" and text == "]":
+            depth -= 1
+        elif kind == "kv" and depth == 0 and m.group("field") in strategies:
+            value = _unquote(m.group("value"))
+            if value.strip("*"):
+                new = _raw_term(value, strategies[m.group("field")])
+                if m.group("op") == "!=":
+                    new = f"NOT {new}"
+                changes.append(f"{text} -> {new}")
+                text = new
+        out.append(text)
+    term_safe = all(r["term_safe"] for r in rules)
+    if not changes:
+        return search_query, [], term_safe
+
+    rest = search_query[tokens[base_end].start():] if base_end < len(tokens) else ""
+    return "".join(out) + rest, changes, term_safe
@@ -0,0 +1,252 @@
+import difflib
+import fnmatch
+import os
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from BackEnd.schema_catalog import SPLUNK_SCHEMA
+
+VALIDATE_SPL = os.getenv("SPLUNK_VALIDATE_QUERIES", "true").lower() == "true"
+
+# fields Splunk adds to every event, whether or not fieldsummary saw them
+DEFAULT_FIELDS = frozenset((
+    "_time", "_raw", "_indextime", "_cd", "_serial", "_si", "_sourcetype", "host", "source",
+    "sourcetype", "index", "splunk_server", "splunk_server_group", "eventtype", "tag", "linecount",
+    "punct", "timestartpos", "timeendpos", "date_hour", "date_mday", "date_minute", "date_month",
+    "date_second", "date_wday", "date_year", "date_zone",
+))
+# search modifiers that look like field=value but are not fields
+SEARCH_MODIFIERS = frozenset((
+    "earliest", "latest", "_index_earliest", "_index_latest", "starttime", "endtime",
+    "startdaysago", "enddaysago", "startminutesago", "endminutesago", "starthoursago",
+    "endhoursago", "searchtimespanhours", "searchtimespandays", "savedsearch", "savedsplunk",
+    "eventtypetag", "hosttag",
+))
+
+RE_TERM = re.compile(r'(?<![\w.:{}@"-])(?P<field>[A-Za-z_@][\w.:{}@-]*)\s*(?P<op>!=|<=|>=|=|<|>)\s*'
+                     r'(?P<value>"(?:[^"\\]|\\.)*"|[^\s()\[\]|]+)')
+_TIME_UNIT = (r'(?:s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?|mon|months?'
+              r'|q|qtrs?|quarters?|y|yrs?|years?)')
+_TIME_SNAP = rf'@(?:{_TIME_UNIT}|w[0-7])'
+_TIME_OFFSET = rf'[+-]\d*{_TIME_UNIT}'
+RE_TIME = re.compile(rf'^(?:now|0|\d{{9,}}|rt|rt{_TIME_OFFSET}'
+                     rf'|(?:{_TIME_OFFSET})?(?:{_TIME_SNAP})?(?:{_TIME_OFFSET})?'
+                     r'|\d{1,2}/\d{1,2}/\d{4}(?::\d{1,2}:\d{2}:\d{2})?)$')
+RE_BAD_NAMED_GROUP = re.compile(r'\(\?<(?![=!])([A-Za-z_]\w*)>')
+RE_REX_GROUP = re.compile(r'\(\?P?<([A-Za-z_]\w*)>')
+RE_EVAL_TARGET = re.compile(r'(?:^|,)\s*([A-Za-z_][\w.]*)\s*=(?!=)')
+RE_AS = re.compile(r'\bas\s+"?([A-Za-z_][\w.]*)"?', re.IGNORECASE)
+RE_BY = re.compile(r'\bby\s+(.+)$', re.IGNORECASE)
+RE_IDENT = re.compile(r'[A-Za-z_][\w.]*')
+
+FIELD_LIST_COMMANDS = {"table", "fields"}
+BY_COMMANDS = {"stats", "chart", "timechart", "eventstats", "streamstats", "top", "rare", "dedup", "tstats"}
+
+
+def mask_quoted(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Replace the inside of "..." strings with spaces (same length) so regexes
+    can run on the query structure. Returns (masked, error) where error
+    reports unbalanced quotes, parentheses or brackets.
+    """
+    out = []
+    in_quote = False
+    escaped = False
+    depth_paren = depth_bracket = 0
+    for ch in text:
+        if in_quote:
+            if escaped:
+                escaped = False
+                out.append(" ")
+            elif ch == "\\":
+                escaped = True
+                out.append(" ")
+            elif ch == '"':
+                in_quote = False
+                out.append(ch)
+            else:
+                out.append(" ")
+            continue
+        if ch == '"':
+            in_quote = True
+        elif ch == "(":
+            depth_paren += 1
+        elif ch == ")":
+            depth_paren -= 1
+        elif ch == "[":
+            depth_bracket += 1
+        elif ch == "]":
+            depth_bracket -= 1
+        if depth_paren < 0 or depth_bracket < 0:
+            return "".join(out), "unbalanced parentheses or brackets"
+        out.append(ch)
+    if in_quote:
+        return "".join(out), "unterminated quoted string"
+    if depth_paren or depth_bracket:
+        return "".join(out), "unbalanced parentheses or brackets"
+    return "".join(out), None
+
+
+def split_pipeline(text: str, masked: str) -> List[str]:
+    """Split on '|' outside quotes and subsearch brackets."""
+    parts, start, depth = [], 0, 0
+    for i, ch in enumerate(masked):
+        if ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts]
+
+
+def _terms(segment: str) -> List[Tuple[str, str, str]]:
+    """(field, op, value) for each field comparison in a search segment, quotes stripped from values."""
+    masked, _ = mask_quoted(segment)
+    terms = []
+    for m in RE_TERM.finditer(masked):
+        value = segment[m.start("value"):m.end("value")]
+        if value.startswith('"') and value.endswith('"') and len(value) >= 2:
+            value = value[1:-1]
+        terms.append((m.group("field"), m.group("op"), value))
+    return terms
+
+
+def _matches(value: str, names: Iterable[str]) -> List[str]:
+    if "*" in value:
+        return [n for n in names if fnmatch.fnmatchcase(n.lower(), value.lower())]
+    return [n for n in names if n.lower() == value.lower()]
+
+
+def _pipeline_fields(segments: List[str]) -> Tuple[List[Tuple[str, str]], Set[str]]:
+    """
+    Fields read by later pipeline commands (stats ... by, table, fields)
+    and fields they create (eval, rex, rename/stats ... as).
+    """
+    used: List[Tuple[str, str]] = []
+    created: Set[str] = set()
+    for seg in segments:
+        masked, _ = mask_quoted(seg)
+        words = masked.split(None, 1)
+        if not words:
+            continue
+        cmd, rest = words[0].lower(), (words[1] if len(words) > 1 else "")
+        if cmd == "rex":
+            created.update(RE_REX_GROUP.findall(seg))
+        elif cmd == "eval":
+            created.update(RE_EVAL_TARGET.findall(rest))
+        created.update(RE_AS.findall(rest))
+        if cmd in FIELD_LIST_COMMANDS and not rest.lstrip().startswith("-"):
+            for name in RE_IDENT.findall(rest.lstrip("+ ")):
+                used.append((cmd, name))
+        elif cmd in BY_COMMANDS:
+            m = RE_BY.search(rest)
+            if m:
+                for name in RE_IDENT.findall(m.group(1).split("|")[0]):
+                    if name.lower() not in ("span", "limit", "useother", "usenull", "where", "as"):
+                        used.append((cmd, name))
+            if cmd in ("stats", "eventstats", "streamstats", "chart", "timechart", "tstats"):
+                created.update(("count",))
+    return used, created
+
+
+def validate_spl(search_query: str, extra_fields: Iterable[str] = ()) -> dict:
+    """
+    Lint an SPL query against docs/splunk_schema.json before a job is created.
+
+    Errors: unbalanced quotes/brackets, no index= or an index/source not in
+    the schema, no earliest= time modifier or a malformed one, and PCRE
+    named groups written as (?<name>) instead of (?P<name>).
+    Fields unknown for the chosen index/source are only warnings (with
+    close matches): the schema comes from sampled events and misses real
+    fields. extra_fields are always accepted, e.g. fields search_splunk
+    rewrites into raw-text terms. Generating commands other than tstats
+    (| inputlookup, | rest, | makeresults) get only the syntax checks.
+    """
+    errors: List[dict] = []
+    warnings: List[dict] = []
+    query = search_query.strip()
+
+    masked, syntax_error = mask_quoted(query)
+    if syntax_error:
+        return {"valid": False, "errors": [{"error": "syntax", "detail": syntax_error}], "warnings": []}
+
+    for m in RE_BAD_NAMED_GROUP.finditer(query):
+        errors.append({"error": "pcre_named_group", "detail": f"use (?P<{m.group(1)}>...) instead of (?<{m.group(1)}>...)"})
+
+    segments = split_pipeline(query, masked)
+    base = segments[0]
+    if base.lower().startswith("search "):
+        base = base[len("search "):]
+    generating = query.startswith("|")          # | tstats ... WHERE index=... / | inputlookup
+    if generating:
+        base = segments[1] if len(segments) > 1 else ""
+        if (base.split(None, 1) or [""])[0].lower() != "tstats":
+            # no index, time range or event fields to check
+            return {"valid": not errors, "errors": errors, "warnings": warnings}
+    terms = _terms(base)
+
+    # --- time range ---
+    times = [(f, v) for f, _, v in _terms(query) if f.lower() in ("earliest", "latest")]
+    if not any(f.lower() == "earliest" for f, _ in times):
+        errors.append({"error": "missing_time_range", "detail": "add earliest=<time> (e.g. earliest=-24h latest=now)"})
+    for f, v in times:
+        if not v or not RE_TIME.match(v):
+            errors.append({"field": f, "error": "invalid_time_modifier",
+                           "detail": f"'{v}' is not a valid time modifier (e.g. -3d, -24h@h, now, 0)"})
+
+    # --- index / source ---
+    known_indexes = SPLUNK_SCHEMA.indexes()
+    index_values = [v for f, op, v in terms if f.lower() == "index" and op == "="]
+    source_values = [v for f, op, v in terms if f.lower() == "source" and op == "="]
+    indexes: List[str] = []
+    if not index_values:
+        errors.append({"error": "missing_index", "detail": f"add index=<name>, one of {known_indexes}"})
+    for value in index_values:
+        found = _matches(value, known_indexes)
+        if not found:
+            errors.append({"field": "index", "value": value, "error": "unknown_index",
+                           "detail": f"index not in schema, use one of {known_indexes}"})
+        elif value.strip("*") == "":
+            warnings.append({"field": "index", "warning": "all_indexes", "detail": "index=* searches every index"})
+        indexes.extend(found)
+
+    pairs: List[Tuple[str, str]] = []
+    for index in indexes:
+        sources = SPLUNK_SCHEMA.sources(index)
+        if not source_values:
+            pairs.extend((index, s) for s in sources)
+        for value in source_values:
+            pairs.extend((index, s) for s in _matches(value, sources))
+    if indexes and source_values and not pairs:
+        available = sorted({s for i in indexes for s in SPLUNK_SCHEMA.sources(i)})
+        for value in source_values:
+            errors.append({"field": "source", "value": value, "error": "unknown_source",
+                           "detail": f"source not in schema for {indexes}",
+                           "suggestions": difflib.get_close_matches(value, available, n=3, cutoff=0.4)})
+
+    # --- fields ---
+    if pairs:
+        known: Set[str] = set(DEFAULT_FIELDS) | set(extra_fields)
+        for index, source in pairs:
+            known |= SPLUNK_SCHEMA.field_set(index, source)
+        seen = set()
+        for field, _, _ in terms:
+            if field in known or field.lower() in SEARCH_MODIFIERS or field in seen:
+                continue
+            seen.add(field)
+            warnings.append({"field": field, "warning": "unknown_field",
+                             "detail": "field not in the sampled schema for the selected index/source",
+                             "suggestions": difflib.get_close_matches(field, known, n=3, cutoff=0.6)})
+
+        used, created = _pipeline_fields(segments[1:])
+        for cmd, field in used:
+            if field in known or field in created or field in seen:
+                continue
+            seen.add(field)
+            warnings.append({"field": field, "warning": "unknown_field",
+                             "detail": f"'{cmd}' uses a field that is not in the schema or created earlier in the pipeline"})
+
+    return {"valid": not errors, "errors": errors, "warnings": warnings}
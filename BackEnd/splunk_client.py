@@ -0,0 +1,189 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+
+import splunklib.binding
+import splunklib.client
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SPLUNK_POOL_SIZE = int(os.getenv("SPLUNK_POOL_SIZE", "4"))
+SPLUNK_HEALTHCHECK_INTERVAL = int(os.getenv("SPLUNK_HEALTHCHECK_INTERVAL", "60"))  # seconds idle before a ping
+SPLUNK_ACQUIRE_TIMEOUT = int(os.getenv("SPLUNK_ACQUIRE_TIMEOUT", "60"))
+
+T = TypeVar("T")
+
+
+def _connection_kwargs() -> dict:
+    verify_ssl = os.getenv("VERIFY_SSL")
+    if isinstance(verify_ssl, str):
+        verify_ssl = verify_ssl.lower() == "true"
+    return {
+        "host": os.getenv("SPLUNK_HOST"),
+        "port": os.getenv("SPLUNK_PORT"),
+        "username": os.getenv("SPLUNK_USERNAME", "admin"),
+        "password": os.getenv("SPLUNK_PASSWORD"),
+        "scheme": os.getenv("SPLUNK_SCHEME"),
+        "verify": verify_ssl,
+        # splunklib logs in again by itself when the session expires
+        "autologin": True,
+    }
+
+
+def is_auth_error(e: Exception) -> bool:
+    return isinstance(e, splunklib.binding.HTTPError) and getattr(e, "status", None) == 401
+
+
+class SplunkServicePool:
+    """
+    Thread-safe pool of splunklib Service objects sharing one session token.
+
+    Only the first service performs a login; later ones are created from the
+    cached token. Services idle for longer than SPLUNK_HEALTHCHECK_INTERVAL are
+    pinged before being handed out, and a 401 triggers a fresh login that is
+    shared with the rest of the pool.
+    """
+
+    def __init__(self, size: int = SPLUNK_POOL_SIZE):
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._token: Optional[str] = None
+
+    # ---------- creation / login ----------
+    def _login(self, service: splunklib.client.Service) -> None:
+        service.login()
+        with self._lock:
+            self._token = service.token
+
+    def relogin(self, service: splunklib.client.Service) -> None:
+        """Log a borrowed service in again after a 401 and share the new token with the pool."""
+        print("Splunk session expired, logging in again")
+        self._login(service)
+
+    def _create(self) -> splunklib.client.Service:
+        kwargs = _connection_kwargs()
+        token = self._token
+        if token:
+            service = splunklib.client.Service(token=token, **kwargs)
+        else:
+            print(f"🔌 Connecting to Splunk at {kwargs['scheme']}://{kwargs['host']}:{kwargs['port']} as {kwargs['username']}")
+            service = splunklib.client.Service(**kwargs)
+            self._login(service)
+            print("Connected to Splunk successfully")
+        return service
+
+    def _healthy(self, service: splunklib.client.Service) -> bool:
+        try:
+            service.get("server/info")
+            return True
+        except Exception as e:
+            if is_auth_error(e):
+                try:
+                    self._login(service)
+                    return True
+                except Exception:
+                    return False
+            return False
+
+    # ---------- acquire / release ----------
+    def _acquire(self) -> splunklib.client.Service:
+        while True:
+            try:
+                service, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._create()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    service, last_used = self._idle.get(timeout=SPLUNK_ACQUIRE_TIMEOUT)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"No Splunk connection became free within {SPLUNK_ACQUIRE_TIMEOUT}s: all "
+                        f"{self.size} pooled connections are in use (raise SPLUNK_POOL_SIZE or "
+                        f"SPLUNK_ACQUIRE_TIMEOUT)"
+                    ) from None
+
+            if time.monotonic() - last_used < SPLUNK_HEALTHCHECK_INTERVAL or self._healthy(service):
+                return service
+            print("Splunk connection failed health check, reconnecting")
+            self.discard(service)
+
+    def _release(self, service: splunklib.client.Service) -> None:
+        self._idle.put((service, time.monotonic()))
+
+    def discard(self, service: splunklib.client.Service) -> None:
+        """Drop a broken service so a new one can be created in its place."""
+        with self._lock:
+            self._created -= 1
+            if self._token == service.token:
+                self._token = None
+
+    @contextmanager
+    def service(self):
+        """
+        Borrow a logged-in Service for the duration of a with-block. The
+        service always goes back (or is discarded when it failed its health
+        check), also when the block is left by GeneratorExit or
+        KeyboardInterrupt, e.g. a streaming generator closed early.
+        """
+        svc = self._acquire()
+        healthy = True
+        try:
+            yield svc
+        except Exception:
+            # a broken connection should not go back into the pool
+            healthy = self._healthy(svc)
+            raise
+        finally:
+            if healthy:
+                self._release(svc)
+            else:
+                self.discard(svc)
+
+    def run(self, fn: Callable[[splunklib.client.Service], T]) -> T:
+        """Call fn(service); on 401 log in again and retry once."""
+        with self.service() as svc:
+            try:
+                return fn(svc)
+            except Exception as e:
+                if not is_auth_error(e):
+                    raise
+                self.relogin(svc)
+                return fn(svc)
+
+
+_pool: Optional[SplunkServicePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_splunk_pool() -> SplunkServicePool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SplunkServicePool()
+    return _pool
+
+
+def splunk_service():
+    """Context manager borrowing a pooled Service: `with splunk_service() as service: ...`"""
+    return get_splunk_pool().service()
+
+
+def run_splunk(fn: Callable[[splunklib.client.Service], T]) -> T:
+    """Run fn(service) on a pooled Service with one re-login retry on 401."""
+    return get_splunk_pool().run(fn)
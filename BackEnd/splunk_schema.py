@@ -1,41 +1,14 @@
-import splunklib.client
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 import json
+import time
 from dotenv import load_dotenv
 import os
+from BackEnd.schema_catalog import atomic_write_json
+from BackEnd.splunk_client import splunk_service
 load_dotenv()
 
-
-def get_splunk_connection() -> splunklib.client.Service:
-    """
-    Get a connection to the Splunk service.
-    
-    Returns:
-        splunklib.client.Service: Connected Splunk service
-    """
-    try:
-        # conf = load_config_splunk()
-        username = os.getenv("SPLUNK_USERNAME", "admin")
-        
-        print(f"🔌 Connecting to Splunk at {os.getenv('SPLUNK_SCHEME')}://{os.getenv('SPLUNK_HOST')}:{os.getenv('SPLUNK_PORT')} as {username}")
-        verify_ssl = os.getenv("VERIFY_SSL")
-        if isinstance(verify_ssl, str):
-            verify_ssl = verify_ssl.lower() == "true"
-
-        service = splunklib.client.connect(
-            host=os.getenv("SPLUNK_HOST"),
-            port=os.getenv("SPLUNK_PORT"),
-            username=username,
-            password=os.getenv("SPLUNK_PASSWORD"),
-            scheme=os.getenv("SPLUNK_SCHEME"),
-            verify=verify_ssl
-        )
-        
-        print(f"Connected to Splunk successfully")
-        return service
-    except Exception as e:
-        print(f"Failed to connect to Splunk: {str(e)}")
-        raise
+SCHEMA_MAX_JOBS = int(os.getenv("SPLUNK_SCHEMA_MAX_JOBS", "4"))        # upper bound on concurrent searches
+SCHEMA_POLL_INTERVAL = float(os.getenv("SPLUNK_SCHEMA_POLL_INTERVAL", "0.5"))
 
 
 def get_indexes_and_sources(timerange: str) -> Dict[str, Any]:
@@ -51,32 +24,33 @@ def get_indexes_and_sources(timerange: str) -> Dict[str, Any]:
         Dict[str, Any]
     """
     try:
-        service = get_splunk_connection()
-        print("Fetching indexes and sources...")
+        with splunk_service() as service:
+            print("Fetching indexes and sources...")
         
-        # Get list of indexes
-        indexes = [index.name for index in service.indexes]
-        print(f"Found {len(indexes)} indexes")
+            # Get list of indexes
+            indexes = [index.name for index in service.indexes]
+            print(f"Found {len(indexes)} indexes")
         
-        # Search for sources across all indexes
-        search_query = """
-        | tstats count WHERE index=* BY index, source
-        | stats count BY index, source
-        | sort - count
-        """
+            # Search for sources across all indexes; tstats already gives one
+            # row per pair with its event count (schema_refresh diffs these counts)
+            search_query = """
+            | tstats count WHERE index=* BY index, source
+            | sort 0 - count
+            """
         
-        kwargs_search = {
-            "earliest_time": timerange,
-            "latest_time": "now",
-            "preview": False,
-            "exec_mode": "blocking"
-        }
+            kwargs_search = {
+                "earliest_time": timerange,
+                "latest_time": "now",
+                "preview": False,
+                "exec_mode": "blocking"
+            }
         
-        print("Executing search for sources...")
-        job = service.jobs.create(search_query, **kwargs_search)
+            print("Executing search for sources...")
+            job = service.jobs.create(search_query, **kwargs_search)
         
-        result_stream = job.results(output_mode='json')
-        results_data = json.loads(result_stream.read().decode('utf-8'))
+            # count=0: all rows, not the default first 100
+            result_stream = job.results(output_mode='json', count=0)
+            results_data = json.loads(result_stream.read().decode('utf-8'))
         
         # Process results
         sources_by_index = {}
@@ -112,36 +86,83 @@ def get_indexes_and_sources(timerange: str) -> Dict[str, Any]:
 
 
 
-def get_fields(index: str, source: str, time_range: str) -> str:
+def fieldsummary_query(index: str, source: str, time_range: str) -> str:
+    # CHANGED: sourcetype -> source
+    return f'search index="{index}" source="{source}" earliest={time_range} | head 100 | fieldsummary'
+
+
+def get_search_quota(service) -> int:
     """
-    Retrieve a list of fields available for an index + source.
+    How many searches the builder may run at once: the user's role
+    srchJobsQuota minus one (left for interactive use), capped by
+    SPLUNK_SCHEMA_MAX_JOBS. Falls back to SPLUNK_SCHEMA_MAX_JOBS when the
+    roles cannot be read.
     """
     try:
-        fields = []
-        service = get_splunk_connection()
+        username = os.getenv("SPLUNK_USERNAME", "admin")
+        roles = service.users[username.lower()].role_entities
+        quota = max(int(role.content.get("srchJobsQuota", 0) or 0) for role in roles)
+        if quota > 1:
+            return max(1, min(SCHEMA_MAX_JOBS, quota - 1))
+    except Exception as e:
+        print(f"Could not read search quota, using SPLUNK_SCHEMA_MAX_JOBS={SCHEMA_MAX_JOBS}: {e}")
+    return SCHEMA_MAX_JOBS
 
-        # CHANGED: sourcetype -> source
-        query = f'search index="{index}" source="{source}" earliest={time_range} | head 100 | fieldsummary'
-        print(f"Executing Splunk query: {query}")
 
-        job = service.jobs.create(query, exec_mode="blocking")
-        results_stream = job.results(output_mode="json", count=0)
-        results_data = json.loads(results_stream.read().decode("utf-8"))
-        
-        if not results_data.get("results"):
-            return json.dumps({"fields": []})
-        else:
-            for result in results_data["results"]:
-                fields.append(result.get("field", ""))
-            
-            response = {
-                'fields': fields,
-            }
-            return json.dumps(response, indent=2)
-    except Exception as e:
-        print(f" Error in get_fields: {str(e)}")
-        return json.dumps({"fields": []})
+def collect_fields_async(pairs: List[Tuple[str, str]], time_range: str) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Run one fieldsummary search per (index, source) as non-blocking jobs.
+
+    At most get_search_quota() jobs run at a time. Running jobs are polled
+    together and their fields are collected as each one finishes, then the
+    job is cancelled to free its artifacts. Failed searches give [].
+    """
+    fields_by_pair: Dict[Tuple[str, str], List[str]] = {}
+    pending = list(pairs)
+    pending.reverse()
+    total = len(pairs)
+
+    with splunk_service() as service:
+        max_jobs = get_search_quota(service)
+        print(f"Running up to {max_jobs} fieldsummary searches concurrently")
+        active = {}
+        try:
+            while pending or active:
+                while pending and len(active) < max_jobs:
+                    index, source = pending.pop()
+                    try:
+                        job = service.jobs.create(fieldsummary_query(index, source, time_range), exec_mode="normal")
+                        active[job.sid] = ((index, source), job)
+                    except Exception as e:
+                        print(f"⚠️ Error dispatching {index}/{source}: {str(e)}")
+                        fields_by_pair[(index, source)] = []
+
+                time.sleep(SCHEMA_POLL_INTERVAL)
+                for sid, (pair, job) in list(active.items()):
+                    try:
+                        if not job.is_done():
+                            continue
+                        fields = []
+                        if job["isFailed"] != "1":
+                            results_stream = job.results(output_mode="json", count=0)
+                            results_data = json.loads(results_stream.read().decode("utf-8"))
+                            fields = [r.get("field", "") for r in results_data.get("results", [])]
+                        fields_by_pair[pair] = fields
+                        job.cancel()
+                    except Exception as e:
+                        print(f"⚠️ Error for {pair[0]}/{pair[1]}: {str(e)}")
+                        fields_by_pair[pair] = []
+                    del active[sid]
+                    print(f"Processed {len(fields_by_pair)}/{total}: {pair[0]}/{pair[1]} ({len(fields_by_pair[pair])} fields)")
+        finally:
+            # don't leave searches running if we were interrupted
+            for _, job in active.values():
+                try:
+                    job.cancel()
+                except Exception:
+                    pass
 
+    return fields_by_pair
 
 
 def build_schema_json(time_range: str = "-7d", save_path: str = "docs/splunk_schema.json") -> Dict[str, dict]:
@@ -156,28 +177,17 @@ def build_schema_json(time_range: str = "-7d", save_path: str = "docs/splunk_sch
         total_count = sum(len(v) for v in sources_by_index.values())
         print(f"Total index/source combinations to process: {total_count}")
 
-        processed = 0
+        pairs = [(index, src_obj["source"]) for index in indexes
+                 for src_obj in sources_by_index.get(index, [])]
+        fields_by_pair = collect_fields_async(pairs, time_range)
 
         for index in indexes:
             schema["indexes"][index] = {"source": {}}
-            sources = sources_by_index.get(index, [])
-
-            for src_obj in sources:
+            for src_obj in sources_by_index.get(index, []):
                 source = src_obj["source"]
-                processed += 1
-                print(f"Processing {processed}/{total_count}: {index}/{source}")
-
-                try:
-                    result = get_fields(index, source, time_range)
-                    field_data = json.loads(result)
-
-                    schema["indexes"][index]["source"][source] = {
-                        "fields": field_data.get("fields", [])
-                    }
-
-                except Exception as e:
-                    print(f"⚠️ Error for {index}/{source}: {str(e)}")
-                    schema["indexes"][index]["source"][source] = {"fields": []}
+                schema["indexes"][index]["source"][source] = {
+                    "fields": fields_by_pair.get((index, source), [])
+                }
 
         # -------------------------------
         # 🚨 REMOVE EMPTY INDEXES & SOURCES
@@ -199,8 +209,7 @@ def build_schema_json(time_range: str = "-7d", save_path: str = "docs/splunk_sch
         schema["indexes"] = cleaned_indexes
 
         # Save file
-        with open(save_path, "w") as f:
-            json.dump(schema, f, indent=2)
+        atomic_write_json(save_path, schema)
 
         print(f"✅ Schema saved to {save_path}")
         return schema
@@ -211,4 +220,5 @@ def build_schema_json(time_range: str = "-7d", save_path: str = "docs/splunk_sch
 
 
 if __name__ == "__main__":
+    # run from the repo root: python -m BackEnd.splunk_schema
     build_schema_json(time_range="-12d")
\ No newline at end of file
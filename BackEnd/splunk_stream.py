@@ -0,0 +1,67 @@
+import json
+import os
+from typing import Iterable, Iterator
+
+import splunklib.results
+
+from BackEnd.splunk_client import get_splunk_pool, is_auth_error
+
+
+def stream_splunk_results(search_query: str, max_results: int = 0, **kwargs) -> Iterator[dict]:
+    """
+    Yield result rows of an SPL query as Splunk produces them.
+
+    Uses the export endpoint, so rows arrive while the search is still running
+    and nothing is buffered beyond the current row. Informational messages from
+    Splunk are printed, not yielded. Stops after max_results rows (0 = no limit)
+    and closes the HTTP stream, which also cancels the search.
+
+    An expired session (401) before the first row is retried once after a
+    fresh login. Closing the generator early returns the pooled service.
+    """
+    pool = get_splunk_pool()
+    with pool.service() as service:
+        count = 0
+        for attempt in range(2):
+            stream = None
+            try:
+                stream = service.jobs.export(search_query, output_mode="json", preview=False, **kwargs)
+                for item in splunklib.results.JSONResultsReader(stream):
+                    if isinstance(item, splunklib.results.Message):
+                        print(f"Splunk {item.type}: {item.message}")
+                        continue
+                    yield item
+                    count += 1
+                    if max_results and count >= max_results:
+                        return
+                return
+            except Exception as e:
+                # rows already handed out can't be taken back, so only retry a clean start
+                if count or attempt or not is_auth_error(e):
+                    raise
+                pool.relogin(service)
+            finally:
+                if stream is not None:
+                    stream.close()
+
+
+def write_ndjson(rows: Iterable[dict], filepath: str) -> int:
+    """
+    Append rows to an NDJSON file one by one. The file is only created once
+    the first row arrives. Returns the number of rows written.
+    """
+    count = 0
+    f = None
+    try:
+        for row in rows:
+            if f is None:
+                os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+                f = open(filepath, "w", encoding="utf-8")
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+            if count % 1000 == 0:
+                f.flush()
+    finally:
+        if f is not None:
+            f.close()
+    return count
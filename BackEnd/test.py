@@ -2,6 +2,12 @@ from crewai import Crew, Process
 from BackEnd.Agents import NL2IOC, Elasticsearch_query_agent, Summary_Agent
 from BackEnd.SplunkAgents import SPLUNK_AGENT
 from BackEnd.Task import *
+from BackEnd.query import Query_Elasticsearch, get_jina_embedding
+from BackEnd.Spunk_tools import search_splunk
+from BackEnd.schema_catalog import ELK_SCHEMA, SPLUNK_SCHEMA
+from BackEnd.semantic_cache import SEMANTIC_CACHE, SEMANTIC_CACHE_ENABLED
+from BackEnd.nl2ioc_parser import parse_intent, NL2IOC_FASTPATH, NL2IOC_FASTPATH_MIN_CONFIDENCE
+from crewai.tasks.task_output import TaskOutput
 from crewai_tools import FileReadTool
 from dotenv import load_dotenv
 import os
@@ -25,9 +31,118 @@ agentops.init(api_key=AGENTOPS_API_KEY)
 # )
 # ReadFile = FileReadTool(file_path="./docs/ELK_schema.json")
 
+def _user_question(input) -> str:
+    """Last user message of the crew input."""
+    messages = input.get("messages", []) if isinstance(input, dict) else []
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content", "")
+    return ""
+
+def _parse_tool_output(raw):
+    """Tool output JSON from a task's final answer, tolerating ```json fences; None if it isn't JSON."""
+    if isinstance(raw, dict):
+        return raw
+    text = (raw or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, str):
+            parsed = json.loads(parsed)
+    except (TypeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def _schema_version(backend):
+    return str((ELK_SCHEMA if backend == "elk" else SPLUNK_SCHEMA).version)
+
+def run_cached_query(backend, question):
+    """
+    Answer from the semantic cache: re-run the final query stored for a
+    near-identical earlier question, skipping the LLM turns. None on a miss
+    or if the stored query no longer runs.
+    """
+    if not SEMANTIC_CACHE_ENABLED or not question:
+        return None
+    try:
+        hit = SEMANTIC_CACHE.lookup(backend, question, _schema_version(backend), get_jina_embedding)
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None
+    print(f"Semantic cache: {SEMANTIC_CACHE.stats()}")
+    if hit is None:
+        return None
+    print(f"⚡ Semantic cache hit ({hit['similarity']}): \"{hit['question']}\"")
+    tool = Query_Elasticsearch if backend == "elk" else search_splunk
+    out = _parse_tool_output(tool.run(**hit["call"]))
+    if out is None or "error" in out:
+        print(f"⚠️  Cached query failed, running the crew: {out}")
+        return None
+    out["semantic_cache"] = {"question": hit["question"], "similarity": hit["similarity"]}
+    return json.dumps(out, ensure_ascii=False)
+
+def remember_query(backend, question, raw, intent_task):
+    """Store the crew's final tool call for question in the semantic cache."""
+    out = _parse_tool_output(raw)
+    if not SEMANTIC_CACHE_ENABLED or not question or out is None or "error" in out:
+        return
+    # the arguments the agent called the tool with, not the rewritten query it ran
+    call = out.get("call")
+    if not isinstance(call, dict):
+        return
+    intent = intent_task.output.raw if intent_task.output else None
+    try:
+        SEMANTIC_CACHE.store(backend, question, _schema_version(backend), intent, call, get_jina_embedding)
+    except Exception as e:
+        print(f"Semantic cache store failed: {e}")
+
+def _task_copies(tasks):
+    """
+    Per-run copies of tasks, their context pointing at the other copies, so
+    a run never writes to the module-level Tasks every session shares.
+    """
+    copies = {}
+    for task in tasks:
+        context = [copies.get(id(t), t) for t in task.context] if isinstance(task.context, list) else task.context
+        copies[id(task)] = task.model_copy(update={"context": context, "output": None})
+    return [copies[id(t)] for t in tasks]
+
+def with_fast_intent(tasks, intent_task, question):
+    """
+    Parse the question locally; when the parser is confident enough, set
+    intent_task's output from it and drop the task so the crew skips that
+    LLM round trip. Later tasks read the intent through their context.
+    tasks must be this run's copies (_task_copies).
+    """
+    if not NL2IOC_FASTPATH or not question:
+        return tasks
+    intent, confidence = parse_intent(question)
+    if confidence < NL2IOC_FASTPATH_MIN_CONFIDENCE:
+        print(f"NL2IOC fast path: confidence {confidence} < {NL2IOC_FASTPATH_MIN_CONFIDENCE}, using the LLM")
+        return tasks
+    print(f"⚡ NL2IOC fast path ({confidence}): {json.dumps(intent, ensure_ascii=False)}")
+    intent_task.output = TaskOutput(
+        description=intent_task.description,
+        raw=json.dumps(intent, ensure_ascii=False),
+        agent=NL2IOC.role,
+    )
+    return [t for t in tasks if t is not intent_task]
+
 def run_elk_agent(input):
     """Execute ELK query pipeline using CrewAI agents."""
-    tasks = [NL2IOC_task, Get_Index_fields_task, SearchQdrant, Query_Elasticsearch_task]
+    question = _user_question(input)
+    cached = run_cached_query("elk", question)
+    if cached is not None:
+        return cached
+
+    tasks = _task_copies([NL2IOC_task, Get_Index_fields_task, SearchQdrant, Query_Elasticsearch_task])
+    intent_task, fields_task, qdrant_task = tasks[:3]
+    # here SearchQdrant also reads the index fields, as the sequential default context gave it
+    qdrant_task.context = [intent_task, fields_task]
+    tasks = with_fast_intent(tasks, intent_task, question)
     crew = Crew(
         agents=[NL2IOC, Elasticsearch_query_agent], 
         tasks=tasks, 
@@ -35,11 +150,20 @@ def run_elk_agent(input):
     )
     
     result = crew.kickoff(input)
+    remember_query("elk", question, result.raw, intent_task)
     return result.raw
 
 def run_splunk_agent(input):
     """Execute Splunk query pipeline using CrewAI agents."""
-    tasks = [NL2IOC_task, SearchQdrant, DetermineIndex_SourceAndFields, CreateValidatedSplunkQuery, GetSplunkData]
+    question = _user_question(input)
+    cached = run_cached_query("splunk", question)
+    if cached is not None:
+        return cached
+
+    tasks = _task_copies([NL2IOC_task, SearchQdrant, DetermineIndex_SourceAndFields,
+                          CreateValidatedSplunkQuery, GetSplunkData])
+    intent_task = tasks[0]
+    tasks = with_fast_intent(tasks, intent_task, question)
     crew = Crew(
         agents=[NL2IOC, SPLUNK_AGENT],
         tasks=tasks,
@@ -47,6 +171,7 @@ def run_splunk_agent(input):
     )
 
     result = crew.kickoff(input)
+    remember_query("splunk", question, result.raw, intent_task)
     return result.raw
 
 def generate_summary_report(input):
@@ -57,7 +182,7 @@ def generate_summary_report(input):
     if isinstance(input, str):
         # Check if input is just a file path (common agent output issue)
         stripped = input.strip()
-        if stripped.startswith("logs/") and stripped.endswith(".json"):
+        if stripped.startswith("logs/") and stripped.endswith((".json", ".ndjson")):
             # Agent returned only the file path, construct proper dict
             parsed = {"saved_file": stripped, "query": ""}
             print(f"Detected file path only, constructed: {parsed}")
@@ -0,0 +1,52 @@
+import os
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+
+load_dotenv()
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://192.168.111.162:6333")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "ELK-doc-v1")
+
+# payload keys returned to the agent: the chunk text plus where it came from,
+# not docling's full doc_items provenance
+SEARCH_PAYLOAD_FIELDS = ["text", "metadata.headings", "metadata.origin.filename"]
+
+_client: Optional[QdrantClient] = None
+_client_lock = threading.Lock()
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Return the process-wide QdrantClient (gRPC when available)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = QdrantClient(
+                    url=QDRANT_URL,
+                    grpc_port=QDRANT_GRPC_PORT,
+                    prefer_grpc=QDRANT_PREFER_GRPC,
+                    timeout=QDRANT_TIMEOUT,
+                    api_key=os.getenv("QDRANT_API_KEY"),
+                )
+    return _client
+
+
+def compact_points(points) -> list:
+    """Turn ScoredPoints into small dicts: score, text, headings, source file."""
+    out = []
+    for p in points:
+        payload = p.payload or {}
+        meta = payload.get("metadata") or {}
+        out.append({
+            "score": round(p.score, 4),
+            "text": payload.get("text", ""),
+            "headings": meta.get("headings") or [],
+            "source": (meta.get("origin") or {}).get("filename"),
+        })
+    return out
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+from BackEnd import es_indices
+
+NOW = datetime(2025, 3, 15, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("value, upper, expected", [
+    ("now-1M", False, NOW - timedelta(days=31)),
+    ("now-1M", True, NOW - timedelta(days=28)),
+    ("now-1y", True, NOW - timedelta(days=365)),
+    ("now+1M", True, NOW + timedelta(days=31)),
+    ("now-1d/d", False, NOW - timedelta(days=2)),
+    ("now-1d/d", True, NOW),
+])
+def test_date_math_resolves_to_the_widest_instant(value, upper, expected):
+    assert es_indices.parse_es_date(value, now=NOW, upper=upper) == expected
+
+
+def test_month_end_bound_keeps_every_overlapping_daily_index(monkeypatch):
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [today - timedelta(days=n) for n in range(70)]
+    entries = [{"index": f"logs-{d:%Y.%m.%d}", "series": "logs-{date}", "date": d, "datastream": False}
+               for d in days]
+    monkeypatch.setattr(es_indices, "list_indices_with_dates", lambda es_url: {"indices": entries, "targets": set()})
+    query = {"range": {"@timestamp": {"gte": "now-2M", "lte": "now-1M"}}}
+    pattern, pruned = es_indices.prune_index_pattern("http://es", "logs-*", query)
+    assert pruned
+    kept = set(pattern.split(","))
+    # the end bound is as late as now-28d when the previous month is February
+    assert f"logs-{today - timedelta(days=28):%Y.%m.%d}" in kept
+    assert f"logs-{today - timedelta(days=1):%Y.%m.%d}" not in kept
@@ -0,0 +1,43 @@
+import pytest
+
+from BackEnd.nl2ioc_parser import parse_intent
+
+
+@pytest.mark.parametrize("question", [
+    "account lockout events in the last 24 hours",
+    "user creation events last 7 days",
+    "host compromised last week",
+])
+def test_plain_words_are_not_entities(question):
+    intent, confidence = parse_intent(question)
+    assert intent["target"]["value"] is None
+    assert not intent["conditions"]
+    assert confidence < 0.8
+
+
+@pytest.mark.parametrize("question, target", [
+    ("failed logins for user=JSmith last 3 days", ("user", "JSmith")),
+    ('logins by user "Bob" today', ("user", "Bob")),
+    ("logins by user CORP\\Admin today", ("user", "CORP\\Admin")),
+    ("logins for account svc_Backup today", ("user", "svc_Backup")),
+    ("failed logins on host DC01 yesterday", ("host", "DC01")),
+    ("powershell on DESKTOP-7A6B43I yesterday", ("host", "DESKTOP-7A6B43I")),
+])
+def test_values_keep_their_case(question, target):
+    intent, confidence = parse_intent(question)
+    assert (intent["target"]["type"], intent["target"]["value"]) == target
+    assert confidence == 1.0
+
+
+@pytest.mark.parametrize("question", [
+    "Show powershell events on PC-001 between 2025-07-01 and 2025-07-03",
+    "Failed logins not from 192.168.1.100 in the last 24 hours",
+    "powershell events on PC-001 excluding user admin last week",
+    "đăng nhập thất bại ngoại trừ host DC01 hôm nay",
+])
+def test_negations_and_absolute_dates_go_to_the_llm(question):
+    assert parse_intent(question)[1] == 0.0
+
+
+def test_leftover_numbers_are_unexplained():
+    assert parse_intent("failed logins on host DC01 top 10 today")[1] < 1.0
@@ -0,0 +1,22 @@
+from BackEnd.semantic_cache import SemanticCache
+
+
+def fake_embed(text):
+    # same vector for every question: only the slots can tell them apart
+    return [1.0, 0.0, 0.0]
+
+
+def test_negated_question_does_not_reuse_the_positive_call(tmp_path):
+    cache = SemanticCache(path=str(tmp_path / "semantic.sqlite3"))
+    cache.store("splunk", "failed logins from 10.0.0.5 today", "v1", None,
+                {"search_query": "search src=10.0.0.5"}, fake_embed)
+    assert cache.lookup("splunk", "failed logins not from 10.0.0.5 today", "v1", fake_embed) is None
+    assert cache.lookup("splunk", "failed logins from 10.0.0.5 today", "v1", fake_embed) is not None
+
+
+def test_lookup_scans_only_recent_entries(tmp_path):
+    cache = SemanticCache(path=str(tmp_path / "semantic.sqlite3"), scan_limit=2)
+    for n in range(3):
+        cache.store("elk", f"question {n}", "v1", None, {"n": n}, fake_embed)
+    assert cache.lookup("elk", "question 0", "v1", fake_embed) is None
+    assert cache.lookup("elk", "question 2", "v1", fake_embed)["call"] == {"n": 2}
@@ -0,0 +1,54 @@
+import pytest
+
+from BackEnd.spl_optimizer import optimize_spl
+from BackEnd.spl_rewriter import rewrite_spl
+
+BASE = "search index=w earliest=-1d"
+SYSMON = 'search index=w source="XmlWinEventLog:Microsoft-Windows-Sysmon/Operational" earliest=-1d'
+
+# (query, term_safe, expected query)
+CASES = [
+    # | fields only when every argument of the transforming command is understood
+    (f"{BASE} | stats count by user", False, f"{BASE} | fields user | stats count by user"),
+    (f"{BASE} | stats count, dc(dest) as n by user, host", False,
+     f"{BASE} | fields dest, user, host | stats count, dc(dest) as n by user, host"),
+    (f"{BASE} | timechart span=1h count by host", False,
+     f"{BASE} | fields host, _time | timechart span=1h count by host"),
+    (f"{BASE} | top limit=5 user by host", False, f"{BASE} | fields user, host | top limit=5 user by host"),
+    (f"{BASE} | chart count over user by host", False, f"{BASE} | chart count over user by host"),
+    (f'{BASE} | stats count by user, "Account Name"', False, f'{BASE} | stats count by user, "Account Name"'),
+    (f"{BASE} | stats count(eval(x>1)) by host", False, f"{BASE} | stats count(eval(x>1)) by host"),
+    (f"{BASE} | stats count where user=a by host", False, f"{BASE} | stats count where user=a by host"),
+    # count over indexed fields -> tstats
+    (f"{BASE} | stats count by host", False, "| tstats count where index=w earliest=-1d by host"),
+    (f'{SYSMON} "10.0.*" | stats count by host', True,
+     '| tstats count where index=w source="XmlWinEventLog:Microsoft-Windows-Sysmon/Operational" earliest=-1d PREFIX(10.0.) by host'),
+    (f'{BASE} "10.0.*" | stats count by host', False, f'{BASE} "10.0.*" | fields host | stats count by host'),
+    # raw terms
+    (f'{BASE} "*10.0.0.5*" | table _time', True, f"{BASE} TERM(10.0.0.5) | table _time"),
+    (f'{BASE} "*powershell.exe*" | table _time', False, f'{BASE} "*powershell.exe*" | table _time'),
+    (f'{BASE} "*/tmp/*" | table _time', False, f"{BASE} /tmp/ | table _time"),
+    (f'{BASE} "*10.0.0.5*" | table _time', False, f'{BASE} "*10.0.0.5*" | table _time'),
+    (f'{BASE} "*net*" | table _time', True, f'{BASE} "*net*" | table _time'),
+    # | search filters move into the base search
+    (f"{BASE} | search host=a | table _time", False, f"{BASE} host=a | table _time"),
+    ("| tstats count where index=w by host", False, "| tstats count where index=w by host"),
+]
+
+
+@pytest.mark.parametrize("query, term_safe, expected", CASES)
+def test_optimize_spl(query, term_safe, expected):
+    assert optimize_spl(query, term_safe)[0] == expected
+
+
+def test_prefix_change_is_reported():
+    _, changes = optimize_spl(f'{SYSMON} "10.0.*" | stats count by host', True)
+    assert changes[0] == '"10.0.*" -> PREFIX(10.0.)'
+
+
+def test_security_ips_keep_their_wildcards():
+    # IpAddress is often ::ffff:10.0.0.5 on the Security log, which TERM(10.0.0.5) would miss
+    query = 'search index=w source="XmlWinEventLog:Security" src_ip=10.0.0.5 earliest=-1d | table _time'
+    rewritten, _, term_safe = rewrite_spl(query)
+    assert not term_safe
+    assert "TERM(" not in optimize_spl(rewritten, term_safe)[0]
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from BackEnd import spl_validator
+from BackEnd.schema_catalog import SplunkSchemaCatalog
+
+SYSMON = "XmlWinEventLog:Microsoft-Windows-Sysmon/Operational"
+
+
+@pytest.fixture(autouse=True)
+def schema(tmp_path, monkeypatch):
+    path = tmp_path / "splunk_schema.json"
+    path.write_text(json.dumps({"indexes": {"wineventlog": {"source": {SYSMON: {"fields": ["EventID", "Image"]}}}}}))
+    monkeypatch.setattr(spl_validator, "SPLUNK_SCHEMA", SplunkSchemaCatalog(str(path)))
+
+
+@pytest.mark.parametrize("query", [
+    "| inputlookup assets.csv",
+    "| rest /services/server/info",
+    "| makeresults count=1 | eval x=1",
+])
+def test_generating_commands_other_than_tstats_are_valid(query):
+    assert spl_validator.validate_spl(query)["valid"]
+
+
+def test_tstats_is_still_checked():
+    errors = spl_validator.validate_spl("| tstats count where index=wineventlog by host")["errors"]
+    assert [e["error"] for e in errors] == ["missing_time_range"]
+
+
+def test_unknown_field_is_a_warning():
+    report = spl_validator.validate_spl(f'search index=wineventlog source="{SYSMON}" EventCode=1 earliest=-1d')
+    assert report["valid"]
+    assert [(w["field"], w["suggestions"]) for w in report["warnings"]] == [("EventCode", ["EventID"])]
+
+
+def test_unknown_index_is_an_error():
+    report = spl_validator.validate_spl("search index=nope earliest=-1d")
+    assert [e["error"] for e in report["errors"]] == ["unknown_index"]
@@ -0,0 +1,104 @@
+import pytest
+
+pytest.importorskip("splunklib")
+pytest.importorskip("dotenv")
+
+import splunklib.results
+
+from BackEnd import splunk_client, splunk_stream
+
+
+class FakeAuthError(Exception):
+    """Stands in for splunklib.binding.HTTPError with status 401."""
+
+
+class FakeStream:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeJobs:
+    def __init__(self, service):
+        self.service = service
+
+    def export(self, query, **kwargs):
+        self.service.exports += 1
+        if self.service.fail_with_401:
+            self.service.fail_with_401 -= 1
+            raise FakeAuthError()
+        stream = FakeStream(self.service.rows)
+        self.service.streams.append(stream)
+        return stream
+
+
+class FakeService:
+    token = "token"
+
+    def __init__(self, rows, fail_with_401=0):
+        self.rows = rows
+        self.fail_with_401 = fail_with_401
+        self.exports = 0
+        self.logins = 0
+        self.streams = []
+        self.jobs = FakeJobs(self)
+
+    def login(self):
+        self.logins += 1
+
+    def get(self, path):
+        return None
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = splunk_client.SplunkServicePool(size=1)
+    monkeypatch.setattr(splunk_client, "_pool", pool)
+    monkeypatch.setattr(splunk_stream, "get_splunk_pool", lambda: pool)
+    monkeypatch.setattr(splunklib.results, "JSONResultsReader", lambda stream: iter(stream.rows))
+    monkeypatch.setattr(splunk_stream, "is_auth_error", lambda e: isinstance(e, FakeAuthError))
+    return pool
+
+
+def _use(pool, service):
+    pool._create = lambda: service
+
+
+def test_early_close_returns_service_to_pool(pool):
+    service = FakeService([{"n": i} for i in range(10)])
+    _use(pool, service)
+    for _ in range(3):          # more closes than the pool has slots
+        rows = splunk_stream.stream_splunk_results("search index=x")
+        assert next(rows) == {"n": 0}
+        rows.close()
+    assert pool._created == 1
+    assert pool._idle.qsize() == 1
+    assert all(s.closed for s in service.streams)
+
+
+def test_max_results_stops_and_closes_stream(pool):
+    service = FakeService([{"n": i} for i in range(10)])
+    _use(pool, service)
+    assert len(list(splunk_stream.stream_splunk_results("search index=x", max_results=3))) == 3
+    assert service.streams[0].closed
+    assert pool._idle.qsize() == 1
+
+
+def test_expired_session_is_retried_once(pool):
+    service = FakeService([{"n": 1}], fail_with_401=1)
+    _use(pool, service)
+    assert list(splunk_stream.stream_splunk_results("search index=x")) == [{"n": 1}]
+    assert service.exports == 2
+    assert service.logins == 1
+
+
+def test_second_auth_failure_is_raised(pool):
+    service = FakeService([{"n": 1}], fail_with_401=2)
+    _use(pool, service)
+    with pytest.raises(FakeAuthError):
+        list(splunk_stream.stream_splunk_results("search index=x"))
+    assert service.exports == 2
+    assert pool._idle.qsize() == 1